@@ -42,6 +42,11 @@ if config.config_file_name is not None:
 # This is what enables `alembic revision --autogenerate`
 target_metadata = Base.metadata
 
+# Type comparison is only useful for autogenerate and is expensive on wide
+# schemas; plain `alembic upgrade head` in CI/deploy skips it by default.
+# Set ALEMBIC_COMPARE_TYPE=1 when autogenerating revisions.
+compare = os.getenv("ALEMBIC_COMPARE_TYPE", "0") == "1"
+
 # -----------------------------------------------------------------------------
 
 def run_migrations_offline() -> None:
@@ -51,7 +56,8 @@ def run_migrations_offline() -> None:
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
-        compare_type=True,          # detect column type changes
+        compare_type=compare,
+        compare_server_default=compare,
         dialect_opts={"paramstyle": "named"},
     )
     with context.begin_transaction():
@@ -69,7 +75,8 @@ def run_migrations_online() -> None:
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
-            compare_type=True,      # detect column type changes
+            compare_type=compare,
+            compare_server_default=compare,
         )
         with context.begin_transaction():
             context.run_migrations()
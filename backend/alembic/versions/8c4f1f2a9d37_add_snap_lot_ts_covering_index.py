@@ -0,0 +1,34 @@
+"""add snap lot/ts covering index
+
+Revision ID: 8c4f1f2a9d37
+Revises: 61209d9166b0
+Create Date: 2026-08-26 14:02:11.847301
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4f1f2a9d37'
+down_revision: Union[str, Sequence[str], None] = '61209d9166b0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_snap_lot_ts',
+        'occupancy_snapshots',
+        ['lot_id', sa.text('ts DESC')],
+        unique=False,
+        postgresql_include=['occupied', 'total'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_snap_lot_ts', table_name='occupancy_snapshots')
@@ -0,0 +1,32 @@
+"""drop redundant snapshot indexes
+
+Revision ID: d19a7c30e5b4
+Revises: 8c4f1f2a9d37
+Create Date: 2026-08-26 15:21:44.109235
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd19a7c30e5b4'
+down_revision: Union[str, Sequence[str], None] = '8c4f1f2a9d37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ix_snap_lot_ts covers every read path; the single-column indexes only
+    # added write amplification on ingest.
+    op.drop_index(op.f('ix_occupancy_snapshots_ts'), table_name='occupancy_snapshots')
+    op.drop_index(op.f('ix_occupancy_snapshots_lot_id'), table_name='occupancy_snapshots')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_occupancy_snapshots_lot_id'), 'occupancy_snapshots', ['lot_id'], unique=False)
+    op.create_index(op.f('ix_occupancy_snapshots_ts'), 'occupancy_snapshots', ['ts'], unique=False)
@@ -1,9 +1,12 @@
 # backend/app/db.py
 from __future__ import annotations
+from array import array
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional, TypedDict
 import threading, bisect
 
+import numpy as np
+
 # ---- Types ----
 class OccRecord(TypedDict, total=False):
     """One occupancy record (used by /api/occupancy and /api/ingest/detections)."""
@@ -14,8 +17,11 @@ class OccRecord(TypedDict, total=False):
     cameraId: str           # optional
 
 # ---- In-memory store ----
-_DB: Dict[str, List[OccRecord]] = {}     # { lotId: [records sorted by timestamp asc] }
-_LOCK = threading.Lock()
+# Struct-of-arrays layout: one parallel column per field, sorted by timestamp.
+# Keeps recent_rates a contiguous C-level loop instead of N dict lookups.
+_COLS: Dict[str, Dict[str, list]] = {}   # { lotId: {"ts": [...], "occ": array, "tot": array, "cam": [...]} }
+_LOCK = threading.Lock()                 # global: lot creation/removal + whole-store ops
+_LOT_LOCKS: Dict[str, threading.Lock] = {}   # per-lot stripes so lots don't contend
 _RETENTION = timedelta(hours=24)          # keep last 24h per lot by default
 
 # ---- Internals ----
@@ -25,9 +31,34 @@ def _ensure_aware_utc(ts: datetime) -> datetime:
         return ts.replace(tzinfo=timezone.utc)
     return ts.astimezone(timezone.utc)
 
-def _key_list(lst: List[OccRecord]) -> List[datetime]:
-    """Extract timestamps (helper for bisect)."""
-    return [r["timestamp"] for r in lst]
+def _lot_lock(lot_id: str) -> threading.Lock:
+    """Return the stripe lock for a lot, creating it under the global lock."""
+    lock = _LOT_LOCKS.get(lot_id)
+    if lock is None:
+        with _LOCK:
+            lock = _LOT_LOCKS.setdefault(lot_id, threading.Lock())
+    return lock
+
+def _lot_cols(lot_id: str) -> Dict[str, list]:
+    return _COLS.setdefault(lot_id, {
+        "ts": [],               # sorted timestamps (bisect key column)
+        "occ": array("i"),      # spacesOccupied
+        "tot": array("i"),      # spacesTotal
+        "cam": [],              # cameraId or None
+    })
+
+def _record_at(lot_id: str, cols: Dict[str, list], i: int) -> OccRecord:
+    """Reconstruct a dict record from the columns (only on demand)."""
+    rec: OccRecord = {
+        "lotId": lot_id,
+        "spacesTotal": cols["tot"][i],
+        "spacesOccupied": cols["occ"][i],
+        "timestamp": cols["ts"][i],
+    }
+    cam = cols["cam"][i]
+    if cam is not None:
+        rec["cameraId"] = cam
+    return rec
 
 # ---- Public API ----
 def add_record(record: OccRecord) -> None:
@@ -40,50 +71,69 @@ def add_record(record: OccRecord) -> None:
             raise ValueError(f"Missing key '{k}' in record")
 
     ts = _ensure_aware_utc(record["timestamp"])
-    rec = {**record, "timestamp": ts}
+    lot_id = record["lotId"]
+    occ = int(record["spacesOccupied"])
+    tot = int(record["spacesTotal"])
+    cam = record.get("cameraId")
 
-    with _LOCK:
-        lst = _DB.setdefault(rec["lotId"], [])
-        idx = bisect.bisect_left(_key_list(lst), ts)
-        lst.insert(idx, rec)
+    with _lot_lock(lot_id):
+        cols = _lot_cols(lot_id)
+        keys = cols["ts"]
+        # Fast path: edge timestamps arrive in order almost always, so an
+        # append avoids the O(n) key scan + insert shift entirely.
+        if not keys or ts >= keys[-1]:
+            keys.append(ts)
+            cols["occ"].append(occ)
+            cols["tot"].append(tot)
+            cols["cam"].append(cam)
+        else:
+            idx = bisect.bisect_left(keys, ts)
+            keys.insert(idx, ts)
+            cols["occ"].insert(idx, occ)
+            cols["tot"].insert(idx, tot)
+            cols["cam"].insert(idx, cam)
 
-        # prune older than retention
+        # prune older than retention (head-drop on every column)
         cutoff = datetime.now(timezone.utc) - _RETENTION
-        first_keep = bisect.bisect_left(_key_list(lst), cutoff)
+        first_keep = bisect.bisect_left(keys, cutoff)
         if first_keep > 0:
-            del lst[:first_keep]
+            del keys[:first_keep]
+            del cols["occ"][:first_keep]
+            del cols["tot"][:first_keep]
+            del cols["cam"][:first_keep]
 
 def get_latest(lot_id: str) -> Optional[OccRecord]:
     """Return the most recent record for a lot, or None."""
-    with _LOCK:
-        lst = _DB.get(lot_id, [])
-        return lst[-1] if lst else None
+    with _lot_lock(lot_id):
+        cols = _COLS.get(lot_id)
+        if not cols or not cols["ts"]:
+            return None
+        return _record_at(lot_id, cols, -1)
 
 def get_history(lot_id: str, minutes: int) -> List[OccRecord]:
     """Return all records from the last `minutes` minutes (sorted asc)."""
     cutoff = datetime.now(timezone.utc) - timedelta(minutes=minutes)
-    with _LOCK:
-        lst = _DB.get(lot_id, [])
-        if not lst:
+    with _lot_lock(lot_id):
+        cols = _COLS.get(lot_id)
+        if not cols or not cols["ts"]:
             return []
-        i = bisect.bisect_left(_key_list(lst), cutoff)
-        return lst[i:].copy()
+        i = bisect.bisect_left(cols["ts"], cutoff)
+        return [_record_at(lot_id, cols, j) for j in range(i, len(cols["ts"]))]
 
 def recent_rates(lot_id: str, n: int = 60) -> List[float]:
     """
     Return up to last n occupancy rates (0..1) for forecasting baselines.
     """
-    with _LOCK:
-        lst = _DB.get(lot_id, [])
-        if not lst:
+    with _lot_lock(lot_id):
+        cols = _COLS.get(lot_id)
+        if not cols or not cols["ts"]:
             return []
-        tail = lst[-n:] if n > 0 else lst[:]
-        out: List[float] = []
-        for r in tail:
-            tot = r.get("spacesTotal") or 0
-            occ = r.get("spacesOccupied") or 0
-            out.append((occ / tot) if tot > 0 else 0.0)
-        return out
+        start = max(0, len(cols["ts"]) - n) if n > 0 else 0
+        occ = np.asarray(cols["occ"][start:], dtype=np.float32)
+        tot = np.asarray(cols["tot"][start:], dtype=np.float32)
+    rates = np.divide(occ, tot, out=np.zeros_like(occ), where=tot > 0)
+    np.clip(rates, 0.0, 1.0, out=rates)
+    return rates.tolist()
 
 # ---- Utilities (handy for tests / maintenance) ----
 def set_retention(hours: float) -> None:
@@ -93,13 +143,14 @@ def set_retention(hours: float) -> None:
 
 def clear(lot_id: Optional[str] = None) -> None:
     """Clear all data (or just one lot). Useful in pytest or local resets."""
-    with _LOCK:
-        if lot_id is None:
-            _DB.clear()
-        else:
-            _DB.pop(lot_id, None)
+    if lot_id is None:
+        with _LOCK:
+            _COLS.clear()
+    else:
+        with _lot_lock(lot_id):
+            _COLS.pop(lot_id, None)
 
 def list_lots() -> List[str]:
     """Return known lotIds (for diagnostics)."""
     with _LOCK:
-        return list(_DB.keys())
+        return list(_COLS.keys())
@@ -1,5 +1,9 @@
 # backend/app/db_sql.py
+import logging
 import os
+import threading
+import time
+from contextlib import nullcontext
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, List
@@ -14,8 +18,9 @@ if not os.getenv("DATABASE_URL"):
         # On Lambda or any environment without python-dotenv installed, skip silently.
         pass
 
-from sqlalchemy import create_engine, select, desc
-from sqlalchemy.orm import sessionmaker
+import numpy as np
+from sqlalchemy import create_engine, insert, select, desc, text
+from sqlalchemy.orm import Session, sessionmaker
 from .models import Base, Lot, Device, Detection, OccupancySnapshot
 
 # ---- Engine / Session setup ---------------------------------------------------
@@ -27,19 +32,138 @@ if not DATABASE_URL:
         "For local dev, put it in backend/.env; for deploy, set it as an environment variable."
     )
 
-# pool_pre_ping=True avoids stale connections (useful with serverless/Neon).
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
+# pool_recycle avoids stale connections (useful with serverless/Neon) without
+# pool_pre_ping's extra SELECT 1 round-trip on every checkout. Pool is sized
+# for uvicorn's threadpool so concurrent /history calls don't queue on checkout.
+engine = create_engine(
+    DATABASE_URL,
+    future=True,
+    pool_size=20,
+    max_overflow=40,
+    pool_recycle=1800,
+    pool_pre_ping=False,
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+logger = logging.getLogger("app.db_sql")
+
 def init_db():
     """Create tables if they don't exist (typically used only in dev)."""
     Base.metadata.create_all(engine)
 
+def get_db():
+    """FastAPI dependency: one session shared by all DB calls in a request."""
+    s = SessionLocal()
+    try:
+        yield s
+    finally:
+        s.close()
+
+def _session_scope(session: Optional[Session]):
+    """Use the caller's session when given, else open (and close) our own."""
+    return nullcontext(session) if session is not None else SessionLocal()
+
+_ZERO = timedelta(0)
+
+def _as_utc(ts: datetime) -> datetime:
+    """Normalize to aware UTC, skipping astimezone when already at UTC."""
+    tz = ts.tzinfo
+    if tz is timezone.utc or (tz is not None and ts.utcoffset() == _ZERO):
+        return ts
+    if tz is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+# ------- Write buffering -------------------------------------------------------
+# add_record enqueues; a daemon thread flushes via Core bulk INSERTs so ingest
+# bursts cost two round-trips per batch instead of two per detection.
+
+_BUFFER: List[Dict] = []
+_BUF_LOCK = threading.Lock()
+
+# Hot cache of the newest snapshot per lot. add_record just wrote the row that
+# get_latest would otherwise re-fetch with ORDER BY ts DESC LIMIT 1.
+_LATEST: Dict[str, Dict] = {}
+_LATEST_LOCK = threading.Lock()
+_FLUSH_BATCH = 500          # flush inline once the buffer grows this large
+_FLUSH_INTERVAL_S = 0.1
+_flush_thread_started = False
+
+
+def _flush() -> None:
+    """Drain the buffer and bulk-insert detections + snapshots."""
+    with _BUF_LOCK:
+        if not _BUFFER:
+            return
+        batch = _BUFFER[:]
+        _BUFFER.clear()
+
+    det_rows = [
+        {
+            "lot_id": r["lotId"],
+            "ts": r["timestamp"],
+            "occupied_count": r["spacesOccupied"],
+            "total_spaces": r["spacesTotal"],
+            "device_id": r.get("cameraId"),
+            "inference_ms": r.get("inference_ms"),
+            "battery_pct": r.get("battery_pct"),
+            "temp_c": r.get("temp_c"),
+        }
+        for r in batch
+    ]
+    snap_rows = [
+        {
+            "lot_id": r["lotId"],
+            "ts": r["timestamp"],
+            "occupied": r["spacesOccupied"],
+            "total": r["spacesTotal"],
+        }
+        for r in batch
+    ]
+    try:
+        with SessionLocal() as s, s.begin():
+            s.execute(insert(Detection), det_rows)
+            s.execute(insert(OccupancySnapshot), snap_rows)
+    except Exception:
+        # Ingest already acked these rows, so dropping the batch here would
+        # lose data silently; put it back at the front for the next attempt.
+        with _BUF_LOCK:
+            _BUFFER[:0] = batch
+        raise
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(_FLUSH_INTERVAL_S)
+        try:
+            _flush()
+        except Exception as e:
+            # Keep the writer alive; _flush re-queued the batch, so the next
+            # tick retries it.
+            logger.error("buffered flush failed (will retry): %s", e)
+
+
+def _ensure_flush_thread() -> None:
+    global _flush_thread_started
+    if _flush_thread_started:
+        return
+    with _BUF_LOCK:
+        if _flush_thread_started:
+            return
+        t = threading.Thread(target=_flush_loop, daemon=True)
+        t.start()
+        _flush_thread_started = True
+
+
+def flush_on_shutdown() -> None:
+    """Drain any buffered rows (wired to FastAPI's shutdown event)."""
+    _flush()
+
 # ------- Mirror existing in-memory signatures ---------------------------------
 
 def add_record(rec: Dict) -> None:
     """
-    Insert a detection and update the occupancy snapshot.
+    Queue a detection + occupancy snapshot for the next bulk flush.
     Expects keys:
       - lotId (str)
       - spacesTotal (int)
@@ -50,92 +174,109 @@ def add_record(rec: Dict) -> None:
       - battery_pct (float, optional)
       - temp_c (float, optional)
     """
-    ts_utc = rec["timestamp"].astimezone(timezone.utc)
-    with SessionLocal() as s, s.begin():
-        s.add(Detection(
-            lot_id=rec["lotId"],
-            ts=ts_utc,
-            occupied_count=rec["spacesOccupied"],
-            total_spaces=rec["spacesTotal"],
-            device_id=rec.get("cameraId"),
-            inference_ms=rec.get("inference_ms"),
-            battery_pct=rec.get("battery_pct"),
-            temp_c=rec.get("temp_c"),
-        ))
-        s.add(OccupancySnapshot(
-            lot_id=rec["lotId"],
-            ts=ts_utc,
-            occupied=rec["spacesOccupied"],
-            total=rec["spacesTotal"],
-        ))
-
-def get_latest(lot_id: str) -> Optional[Dict]:
-    with SessionLocal() as s:
-        row = (
-            s.execute(
-                select(OccupancySnapshot)
-                .where(OccupancySnapshot.lot_id == lot_id)
-                .order_by(desc(OccupancySnapshot.ts))
-                .limit(1)
-            )
-            .scalars()
-            .first()
+    ts_utc = _as_utc(rec["timestamp"])
+    _ensure_flush_thread()
+    with _BUF_LOCK:
+        _BUFFER.append({**rec, "timestamp": ts_utc})
+        should_flush = len(_BUFFER) >= _FLUSH_BATCH
+
+    with _LATEST_LOCK:
+        cur = _LATEST.get(rec["lotId"])
+        if cur is None or ts_utc >= cur["timestamp"]:
+            _LATEST[rec["lotId"]] = {
+                "lotId": rec["lotId"],
+                "timestamp": ts_utc,
+                "spacesTotal": rec["spacesTotal"],
+                "spacesOccupied": rec["spacesOccupied"],
+            }
+
+    if should_flush:
+        _flush()
+
+def get_latest(lot_id: str, session: Optional[Session] = None) -> Optional[Dict]:
+    with _LATEST_LOCK:
+        cached = _LATEST.get(lot_id)
+    if cached is not None:
+        return dict(cached)
+
+    with _session_scope(session) as s:
+        # session.scalar() skips the Result/ScalarResult wrappers for 1-row reads
+        row = s.scalar(
+            select(OccupancySnapshot)
+            .where(OccupancySnapshot.lot_id == lot_id)
+            .order_by(desc(OccupancySnapshot.ts))
+            .limit(1)
         )
         if not row:
             return None
-        return {
+        rec = {
             "lotId": row.lot_id,
-            "timestamp": row.ts.astimezone(timezone.utc),
+            "timestamp": _as_utc(row.ts),
             "spacesTotal": row.total,
             "spacesOccupied": row.occupied,
         }
+        # Warm the cache so the next poll skips SQL entirely.
+        with _LATEST_LOCK:
+            cur = _LATEST.get(lot_id)
+            if cur is None or rec["timestamp"] >= cur["timestamp"]:
+                _LATEST[lot_id] = dict(rec)
+        return rec
 
-def get_history(lot_id: str, minutes: int) -> List[Dict]:
+def get_history(lot_id: str, minutes: int, session: Optional[Session] = None) -> List[Dict]:
     cutoff = datetime.now(timezone.utc) - timedelta(minutes=minutes)
-    with SessionLocal() as s:
-        rows = (
-            s.execute(
-                select(OccupancySnapshot)
-                .where(OccupancySnapshot.lot_id == lot_id, OccupancySnapshot.ts >= cutoff)
-                .order_by(OccupancySnapshot.ts)
-            )
-            .scalars()
-            .all()
-        )
+    with _session_scope(session) as s:
+        rows = s.scalars(
+            select(OccupancySnapshot)
+            .where(OccupancySnapshot.lot_id == lot_id, OccupancySnapshot.ts >= cutoff)
+            .order_by(OccupancySnapshot.ts)
+        ).all()
         return [
             {
                 "lotId": r.lot_id,
-                "timestamp": r.ts.astimezone(timezone.utc),
+                "timestamp": _as_utc(r.ts),
                 "spacesTotal": r.total,
                 "spacesOccupied": r.occupied,
             }
             for r in rows
         ]
         
-def recent_rates(lot_id: str, n: int = 60) -> List[float]:
+def recent_rates(lot_id: str, n: int = 60, session: Optional[Session] = None) -> List[float]:
     """
     Return up to `n` most-recent occupancy rates for a lot as floats in [0.0, 1.0],
     oldest→newest. Uses OccupancySnapshot for speed.
     """
-    with SessionLocal() as s:
-        rows = (
-            s.execute(
-                select(OccupancySnapshot)
-                .where(OccupancySnapshot.lot_id == lot_id)
-                .order_by(desc(OccupancySnapshot.ts))
-                .limit(n)
-            )
-            .scalars()
-            .all()
-        )
+    with _session_scope(session) as s:
+        data = s.execute(
+            select(OccupancySnapshot.occupied, OccupancySnapshot.total)
+            .where(OccupancySnapshot.lot_id == lot_id)
+            .order_by(desc(OccupancySnapshot.ts))
+            .limit(n)
+        ).all()
+
+    if not data:
+        return []
+
+    # One vectorized divide + clip instead of a per-row Python loop.
+    arr = np.array(data, dtype=np.int32)      # (N, 2): occupied, total
+    occ, tot = arr[:, 0], arr[:, 1]
+    rates = np.divide(occ, tot, out=np.zeros(len(arr), dtype=np.float32), where=tot > 0)
+    np.clip(rates, 0.0, 1.0, out=rates)
+    return rates[::-1].tolist()  # chronological order
 
-        rates: List[float] = []
-        for r in rows:
-            tot = (r.total or 0)
-            occ = (r.occupied or 0)
-            if tot > 0:
-                rate = max(0.0, min(1.0, occ / tot))
-                rates.append(float(rate))
+_MEDIAN_RATE_SQL = text(
+    """
+    SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY r)
+    FROM (SELECT (occupied::float / NULLIF(total, 0)) AS r
+          FROM occupancy_snapshots
+          WHERE lot_id = :lot AND total > 0
+          ORDER BY ts DESC LIMIT :n) sub
+    """
+)
 
-        rates.reverse()  # return in chronological order
-        return rates
\ No newline at end of file
+def recent_rate_median(lot_id: str, n: int = 60, session: Optional[Session] = None) -> Optional[float]:
+    """
+    Median of the last `n` occupancy rates, computed in the DB as a single
+    percentile aggregate (no row materialization). None when there's no data.
+    """
+    with _session_scope(session) as s:
+        return s.execute(_MEDIAN_RATE_SQL, {"lot": lot_id, "n": n}).scalar()
\ No newline at end of file
@@ -1,23 +1,23 @@
 import os
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Dict
-import statistics as stats
+from typing import List, Optional, Dict, Tuple
 import logging
+import threading
 import traceback
 
 from fastapi import FastAPI
 from .routers import forecast
 
-app = FastAPI()
-
-app.include_router(forecast.router, prefix="/api")   # → /api/forecast/{lot_id}
-
-
 # ---- logging ---------------------------------------------------------------
 logger = logging.getLogger("app")
 logger.setLevel(logging.INFO)
 
+def _iso_z(dt: datetime) -> str:
+    """ISO-8601 with Z suffix; splices the fixed-width +00:00 instead of .replace."""
+    s = dt.isoformat()
+    return s[:-6] + "Z" if s.endswith("+00:00") else s
+
 # === constants ===
 TOTAL_SPOTS = 77
 SPOT_COUNTS = {"regular": 73, "handicapped": 4}
@@ -30,9 +30,10 @@ if not os.getenv("DATABASE_URL"):
     except ModuleNotFoundError:
         pass
 
-from fastapi import FastAPI, HTTPException, status, Query
+from fastapi import Depends, FastAPI, HTTPException, Request, Response, status, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
+from sqlalchemy.orm import Session
 
 from . import db_sql as db
 from pydantic import BaseModel, Field
@@ -41,12 +42,22 @@ from .schemas import (
     SnapshotOut, ForecastOut, ForecastPoint, SystemStatus
 )
 
-app = FastAPI(title="Parking Lot Occupancy Tracker API", version="0.2.0")
+app = FastAPI(
+    title="Parking Lot Occupancy Tracker API",
+    version="0.2.0",
+    default_response_class=ORJSONResponse,   # orjson: native datetimes, faster dumps
+)
+
+app.include_router(forecast.router, prefix="/api")   # → /api/forecast/{lot_id}
 
 @app.get("/", include_in_schema=False)
 def root():
     return RedirectResponse(url="/docs")
 
+@app.on_event("shutdown")
+def _drain_write_buffer():
+    db.flush_on_shutdown()
+
 # CORS for local dev (tighten later)
 app.add_middleware(
     CORSMiddleware,
@@ -75,45 +86,67 @@ class Spot(SpotBase):
 
 # In-memory store (replace with DB later)
 _SPOTS: Dict[str, Spot] = {}
+_SPOTS_LOCK = threading.Lock()
+_SPOTS_VER = 0                          # bumped on every mutation
+_SPOTS_CACHE: Tuple[Spot, ...] = ()     # snapshot reused until the version moves
+_SPOTS_CACHE_VER = -1
 
 # ---------- Spots CRUD ----------
 @app.get("/api/spots", response_model=List[Spot])
 def list_spots():
-    return list(_SPOTS.values())
+    global _SPOTS_CACHE, _SPOTS_CACHE_VER
+    # Read-mostly: only re-snapshot when a write bumped the version.
+    if _SPOTS_CACHE_VER != _SPOTS_VER:
+        with _SPOTS_LOCK:
+            _SPOTS_CACHE = tuple(_SPOTS.values())
+            _SPOTS_CACHE_VER = _SPOTS_VER
+    return list(_SPOTS_CACHE)
 
 @app.post("/api/spots", response_model=Spot, status_code=status.HTTP_201_CREATED)
 def create_spot(spot: SpotCreate):
-    if spot.id in _SPOTS:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Spot already exists")
+    global _SPOTS_VER
     last_update = spot.last_update or datetime.now(timezone.utc)
-    created = Spot(**spot.model_dump(), last_update=last_update)
-    _SPOTS[spot.id] = created
+    # Payload fields are already validated; model_construct skips re-validation
+    created = Spot.model_construct(
+        id=spot.id, label=spot.label, occupied=spot.occupied, last_update=last_update
+    )
+    with _SPOTS_LOCK:
+        if spot.id in _SPOTS:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Spot already exists")
+        _SPOTS[spot.id] = created
+        _SPOTS_VER += 1
     return created
 
 @app.patch("/api/spots/{spot_id}", response_model=Spot)
 def update_spot(spot_id: str, patch: SpotUpdate):
-    cur = _SPOTS.get(spot_id)
-    if not cur:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Spot not found")
-    data = cur.model_dump()
-    for k, v in patch.model_dump(exclude_unset=True).items():
-        data[k] = v
-    # auto timestamp if not provided
-    data["last_update"] = data.get("last_update") or datetime.now(timezone.utc)
-    updated = Spot(**data)
-    _SPOTS[spot_id] = updated
+    global _SPOTS_VER
+    updates = patch.model_dump(exclude_unset=True)
+    with _SPOTS_LOCK:
+        cur = _SPOTS.get(spot_id)
+        if not cur:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Spot not found")
+        # auto timestamp only when neither the patch nor the spot has one
+        if updates.get("last_update") is None:
+            updates["last_update"] = cur.last_update or datetime.now(timezone.utc)
+        # model_copy applies the patch without dumping + re-validating the whole model
+        updated = cur.model_copy(update=updates)
+        _SPOTS[spot_id] = updated
+        _SPOTS_VER += 1
     return updated
 
 @app.delete("/api/spots/{spot_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_spot(spot_id: str):
-    if spot_id not in _SPOTS:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Spot not found")
-    del _SPOTS[spot_id]
+    global _SPOTS_VER
+    with _SPOTS_LOCK:
+        if spot_id not in _SPOTS:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Spot not found")
+        del _SPOTS[spot_id]
+        _SPOTS_VER += 1
     return None
 
 # ---------- Occupancy time-series ----------
 @app.post("/api/occupancy", response_model=OccupancyOut, status_code=status.HTTP_201_CREATED)
-def post_occupancy(payload: OccupancyIn):
+def post_occupancy(payload: OccupancyIn, db_session: Session = Depends(db.get_db)):
     if payload.spacesOccupied > payload.spacesTotal:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="spacesOccupied cannot exceed spacesTotal")
@@ -121,14 +154,14 @@ def post_occupancy(payload: OccupancyIn):
     # 1) Use server time if client omitted timestamp
     ts = payload.timestamp or datetime.now(timezone.utc)
 
-    # 2) Normalize to UTC
+    # 2) Normalize to UTC (skip the astimezone walk when already at UTC)
     if ts.tzinfo is None:
         ts = ts.replace(tzinfo=timezone.utc)
-    else:
+    elif ts.utcoffset():
         ts = ts.astimezone(timezone.utc)
 
     # 3) Ensure strictly newer than the current latest so /snapshot updates
-    latest = db.get_latest(payload.lotId)
+    latest = db.get_latest(payload.lotId, session=db_session)
     if latest and ts <= latest["timestamp"]:
         ts = latest["timestamp"] + timedelta(seconds=1)
 
@@ -143,32 +176,50 @@ def post_occupancy(payload: OccupancyIn):
     return rec
 
 @app.get("/api/occupancy/{lot_id}/current", response_model=OccupancyOut)
-def get_current(lot_id: str):
-    latest = db.get_latest(lot_id)
+def get_current(lot_id: str, request: Request, response: Response,
+                db_session: Session = Depends(db.get_db)):
+    latest = db.get_latest(lot_id, session=db_session)
     if not latest:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No records for lotId")
+    # Data only changes when a new detection lands (~1/min); let 2s pollers
+    # revalidate with If-None-Match instead of re-reading every time.
+    etag = f'W/"{lot_id}:{int(latest["timestamp"].timestamp())}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "public, max-age=1"
     return latest
 
-@app.get("/api/occupancy/{lot_id}/history", response_model=List[OccupancyOut])
+@app.get("/api/occupancy/{lot_id}/history",
+         response_model=List[OccupancyOut], response_class=ORJSONResponse)
 def get_history(lot_id: str,
-                minutes: int = Query(60, ge=1, le=24*60, description="Window in minutes")):
-    return db.get_history(lot_id, minutes)
+                minutes: int = Query(60, ge=1, le=24*60, description="Window in minutes"),
+                db_session: Session = Depends(db.get_db)):
+    # Largest response in the API: skip the Pydantic validation pass and hand
+    # the list of dicts straight to orjson (datetimes serialize natively).
+    return ORJSONResponse(db.get_history(lot_id, minutes, session=db_session))
 
 # ---------- Edge ingestion (Pi → server) ----------
-@app.post("/api/ingest/detections")
-def ingest_detection(d: DetectionIn):
+def _normalize_detection(d: DetectionIn, prev_ts: Optional[datetime]) -> Dict:
     """
-    Normalize edge payloads:
+    Normalize one edge payload:
       - Enforce canonical total spots (TOTAL_SPOTS).
       - Clamp occupied_count to [0, TOTAL_SPOTS].
       - Parse ISO timestamp and store as UTC.
-      - Ensure strictly monotonic timestamps (so snapshot updates).
+      - Ensure strictly newer than `prev_ts` (so snapshot updates).
     """
-    # 1) Parse timestamp
+    # 1) Parse timestamp (slice the trailing Z instead of scanning with .replace)
+    s = d.ts_iso
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
     try:
-        ts_utc = datetime.fromisoformat(d.ts_iso.replace("Z", "+00:00")).astimezone(timezone.utc)
-    except Exception as e:
+        ts_utc = datetime.fromisoformat(s)
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Bad ts_iso: {e}")
+    if ts_utc.tzinfo is None:
+        ts_utc = ts_utc.replace(tzinfo=timezone.utc)
+    elif ts_utc.utcoffset():
+        ts_utc = ts_utc.astimezone(timezone.utc)
 
     # 2) Enforce totals and clamp occupied
     total = TOTAL_SPOTS
@@ -185,12 +236,10 @@ def ingest_detection(d: DetectionIn):
         occ = total
 
     # 3) Make timestamp strictly newer than last write for this lot
-    latest = db.get_latest(d.lot_id)
-    if latest and ts_utc <= latest["timestamp"]:
-        ts_utc = latest["timestamp"] + timedelta(seconds=1)
+    if prev_ts and ts_utc <= prev_ts:
+        ts_utc = prev_ts + timedelta(seconds=1)
 
-    # 4) Persist normalized record
-    rec = {
+    return {
         "lotId": d.lot_id,
         "spacesTotal": total,      # canonical
         "spacesOccupied": occ,     # clamped
@@ -198,27 +247,60 @@ def ingest_detection(d: DetectionIn):
         "cameraId": d.camera_id,
     }
 
+@app.post("/api/ingest/detections")
+def ingest_detection(d: DetectionIn, db_session: Session = Depends(db.get_db)):
+    latest = db.get_latest(d.lot_id, session=db_session)
+    rec = _normalize_detection(d, latest["timestamp"] if latest else None)
+
     try:
         db.add_record(rec)
-        _EDGE_LAST_SEEN[d.lot_id] = ts_utc
+        _EDGE_LAST_SEEN[d.lot_id] = rec["timestamp"]
         return {
             "ok": True,
             "lot_id": d.lot_id,
-            "occupied_count": occ,
-            "total_spots": total,
-            "ts_iso": ts_utc.isoformat().replace("+00:00", "Z"),
+            "occupied_count": rec["spacesOccupied"],
+            "total_spots": rec["spacesTotal"],
+            "ts_iso": _iso_z(rec["timestamp"]),
         }
     except Exception as e:
         logger.error("add_record failed: %s\n%s", e, traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"DB write failed: {e}")
 
+@app.post("/api/ingest/detections/bulk")
+def ingest_detections_bulk(batch: List[DetectionIn], db_session: Session = Depends(db.get_db)):
+    """
+    Bulk variant for the edge outbox: one request validates and queues a whole
+    drained batch instead of paying per-row dispatch + validation 50 times.
+    """
+    last_ts: Dict[str, Optional[datetime]] = {}
+    recs = []
+    for d in batch:
+        if d.lot_id not in last_ts:
+            latest = db.get_latest(d.lot_id, session=db_session)
+            last_ts[d.lot_id] = latest["timestamp"] if latest else None
+        rec = _normalize_detection(d, last_ts[d.lot_id])
+        last_ts[d.lot_id] = rec["timestamp"]
+        recs.append(rec)
+
+    try:
+        for rec in recs:
+            db.add_record(rec)
+            _EDGE_LAST_SEEN[rec["lotId"]] = rec["timestamp"]
+    except Exception as e:
+        logger.error("bulk add_record failed: %s\n%s", e, traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"DB write failed: {e}")
+
+    return {"ok": True, "ingested": len(recs)}
+
 # ---------- Unified snapshot & baseline forecast ----------
 @app.get("/api/occupancy/snapshot", response_model=SnapshotOut)
-def occupancy_snapshot(lot_id: str = Query(..., min_length=1)):
-    latest = db.get_latest(lot_id)
+def occupancy_snapshot(request: Request, response: Response,
+                       lot_id: str = Query(..., min_length=1),
+                       db_session: Session = Depends(db.get_db)):
+    latest = db.get_latest(lot_id, session=db_session)
     if not latest:
         # Cold start: show canonical capacity with 0 occupied
-        now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+        now = _iso_z(datetime.now(timezone.utc))
         return SnapshotOut(
             lot_id=lot_id,
             ts_iso=now,
@@ -227,7 +309,14 @@ def occupancy_snapshot(lot_id: str = Query(..., min_length=1)):
             occupancy_rate=0.0,
         )
 
-    ts = latest["timestamp"].astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+    etag = f'W/"{lot_id}:{int(latest["timestamp"].timestamp())}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "public, max-age=1"
+
+    # db.get_latest already returns aware-UTC timestamps
+    ts = _iso_z(latest["timestamp"])
     occ = int(latest.get("spacesOccupied", 0) or 0)
     tot = TOTAL_SPOTS  # enforce canonical total in responses
     rate = (occ / tot) if tot else 0.0
@@ -241,16 +330,15 @@ def occupancy_snapshot(lot_id: str = Query(..., min_length=1)):
     )
 
 @app.get("/api/forecast", response_model=ForecastOut)
-def get_forecast(lot_id: str = Query(..., min_length=1), hours: int = Query(12, ge=1, le=48)):
+def get_forecast(lot_id: str = Query(..., min_length=1), hours: int = Query(12, ge=1, le=48),
+                 db_session: Session = Depends(db.get_db)):
     now = datetime.now(timezone.utc)
 
-    # If you store rates directly (0..1), median is fine.
-    # If recent_rates returns occupancy ratios, they already reflect TOTAL_SPOTS.
-    rates = db.recent_rates(lot_id, n=60)  # ~last hour if ~1/min sampling
-    if rates:
-        baseline = stats.median(rates)
-    else:
-        latest = db.get_latest(lot_id)
+    # Median of the last hour's rates, computed in the DB as one aggregate
+    # instead of fetching 60 rows and running statistics.median here.
+    baseline = db.recent_rate_median(lot_id, n=60, session=db_session)
+    if baseline is None:
+        latest = db.get_latest(lot_id, session=db_session)
         occ = int(latest["spacesOccupied"]) if latest and latest.get("spacesOccupied") is not None else 0
         baseline = (occ / TOTAL_SPOTS) if TOTAL_SPOTS else 0.0
 
@@ -258,7 +346,7 @@ def get_forecast(lot_id: str = Query(..., min_length=1), hours: int = Query(12,
 
     points = []
     for h in range(1, hours + 1):
-        t = (now + timedelta(hours=h)).isoformat().replace("+00:00", "Z")
+        t = _iso_z(now + timedelta(hours=h))
         points.append(ForecastPoint(ts_iso=t, expected_occupancy_rate=baseline))
 
     return ForecastOut(lot_id=lot_id, horizon_hours=hours, points=points)
@@ -269,14 +357,16 @@ _EDGE_LAST_SEEN: Dict[str, datetime] = {}
 
 @app.get("/api/status", response_model=SystemStatus)
 def get_status():
-    uptime = int((datetime.now(timezone.utc) - _SERVICE_START).total_seconds())
-    recent = [t for t in _EDGE_LAST_SEEN.values() if (datetime.now(timezone.utc) - t) <= timedelta(minutes=2)]
-    last_seen = max(_EDGE_LAST_SEEN.values()).isoformat().replace("+00:00", "Z") if _EDGE_LAST_SEEN else None
+    now = datetime.now(timezone.utc)   # one clock read per request
+    uptime = int((now - _SERVICE_START).total_seconds())
+    two_min_ago = now - timedelta(minutes=2)
+    cameras_online = sum(1 for t in _EDGE_LAST_SEEN.values() if t >= two_min_ago)
+    last_seen = _iso_z(max(_EDGE_LAST_SEEN.values())) if _EDGE_LAST_SEEN else None
     return SystemStatus(
         service_uptime_s=uptime,
         edge_last_seen_iso=last_seen,
         est_battery_pct=None,   # wire real telemetry later
-        cameras_online=len(recent),
+        cameras_online=cameras_online,
     )
 
 from mangum import Mangum
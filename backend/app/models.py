@@ -1,5 +1,5 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Integer, BigInteger, DateTime, Text, JSON, ForeignKey
+from sqlalchemy import String, Integer, BigInteger, DateTime, Text, JSON, ForeignKey, Index
 from datetime import datetime, timezone
 
 class Base(DeclarativeBase): pass
@@ -36,11 +36,22 @@ class Detection(Base):
 class OccupancySnapshot(Base):
     __tablename__ = "occupancy_snapshots"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    lot_id: Mapped[str] = mapped_column(String, ForeignKey("lots.id", ondelete="CASCADE"), index=True)
-    ts: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    lot_id: Mapped[str] = mapped_column(String, ForeignKey("lots.id", ondelete="CASCADE"))
+    ts: Mapped[datetime] = mapped_column(DateTime(timezone=True))
     occupied: Mapped[int] = mapped_column(Integer)
     total: Mapped[int] = mapped_column(Integer)
 
+# Covering index: every read filters on lot_id + ts and only needs
+# occupied/total, so queries become index-only range scans. The composite
+# also supersedes the old single-column lot_id/ts indexes (dropped in a
+# migration) — keeping them only slowed down ingest writes.
+Index(
+    "ix_snap_lot_ts",
+    OccupancySnapshot.lot_id,
+    OccupancySnapshot.ts.desc(),
+    postgresql_include=["occupied", "total"],
+)
+
 class Forecast(Base):
     __tablename__ = "forecasts"
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
@@ -1,4 +1,8 @@
 # backend/app/routers/forecast.py
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from pathlib import Path
 from typing import List
@@ -6,45 +10,132 @@ from typing import List
 import joblib
 import numpy as np
 import pandas as pd
-import torch
-from fastapi import APIRouter, HTTPException
+import onnxruntime as ort
+from fastapi import APIRouter, HTTPException, Request, Response, status
 
-from ml.model_lstm import OccupancyLSTM, LSTMConfig
 from ml.data_loader import fetch_timeseries
+from .. import db_sql as db
 
 router = APIRouter(prefix="/forecast", tags=["forecast"])
 
 ARTIFACT_DIR = Path(__file__).resolve().parents[1] / "ml" / "artifacts"
 
+# A forecast only changes when a new snapshot lands or the model is
+# retrained, so responses are cached per lot under an ETag derived from
+# both; pollers between snapshots get a 304 or the memoized payload.
+_RESP_CACHE: dict = {}  # lot_id -> (etag, payload)
+
+# Bounded pool for the fetch + forward: keeps concurrent forecasts from
+# oversubscribing BLAS threads (each runner is already single-threaded)
+# while the event loop stays free for the cheap routes.
+_INFER_POOL = ThreadPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) // 2))
+
+
+def _onnx_runner(int8_path: Path):
+    # Single-request serving: one intra-op thread avoids thread-pool wakeup
+    # latency that dominates a batch=1 LSTM forward.
+    so = ort.SessionOptions()
+    so.intra_op_num_threads = 1
+    sess = ort.InferenceSession(
+        str(int8_path), sess_options=so, providers=["CPUExecutionProvider"]
+    )
+    return lambda x: sess.run(None, {"x": x})[0]
+
+
+def _torchscript_runner(pt_path: Path, meta):
+    # Fallback for artifacts trained before the ONNX export existed: trace
+    # and freeze the eager module once at load time so per-request forwards
+    # run TorchScript's fused LSTM kernels instead of Python dispatch.
+    import torch
+    from ml.model_lstm import OccupancyLSTM, LSTMConfig
+
+    # Legacy metas predate the configurable size and were trained at the
+    # old 64-hidden / 2-layer defaults.
+    cfg = LSTMConfig(
+        n_features=len(meta["feature_cols"]),
+        hidden_size=meta.get("hidden_size", 64),
+        num_layers=meta.get("num_layers", 2),
+    )
+    torch.set_num_threads(1)
+    model = OccupancyLSTM(cfg)
+    model.load_state_dict(torch.load(pt_path, map_location="cpu"))
+    model.eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(
+            model, torch.zeros(1, meta["seq_len"], cfg.n_features)
+        )
+        traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+
+    def run(x):
+        with torch.no_grad():
+            return traced(torch.from_numpy(x)).numpy()
+
+    return run
+
+
+@functools.lru_cache(maxsize=64)
+def _load_cached(lot_id: str, mtime_ns: int):
+    """Load runner + meta once per (lot, artifact version).
+
+    `mtime_ns` is only part of the key: retraining a lot rewrites the
+    artifact and naturally invalidates the cached entry.
+    """
+    meta = joblib.load(ARTIFACT_DIR / f"lot_{lot_id}.pkl")
+
+    # Scaling coefficients as plain float32 so the hot path applies
+    # `(x - min) * scale` directly. New artifacts store them that way;
+    # legacy ones carry sklearn scalers we unpack once here.
+    if "feat_scale" not in meta:
+        feat_scaler = meta["feat_scaler"]
+        meta["feat_scale"] = feat_scaler.scale_.astype(np.float32)
+        meta["feat_min"] = feat_scaler.data_min_.astype(np.float32)
+        targ_scaler = meta["targ_scaler"]
+        meta["targ_scale"] = float(targ_scaler.scale_[0])
+        meta["targ_min"] = float(targ_scaler.data_min_[0])
+
+    int8_path = ARTIFACT_DIR / f"lot_{lot_id}.int8.onnx"
+    if int8_path.exists():
+        runner = _onnx_runner(int8_path)
+    else:
+        runner = _torchscript_runner(
+            (ARTIFACT_DIR / f"lot_{lot_id}").with_suffix(".pt"), meta
+        )
+    return runner, meta
+
 
 def load_model_for_lot(lot_id: str):
     lot_prefix = ARTIFACT_DIR / f"lot_{lot_id}"
-    model_path = lot_prefix.with_suffix(".pt")
+    model_path = ARTIFACT_DIR / f"lot_{lot_id}.int8.onnx"
+    if not model_path.exists():
+        model_path = lot_prefix.with_suffix(".pt")
     meta_path = lot_prefix.with_suffix(".pkl")
 
     if not model_path.exists() or not meta_path.exists():
         raise FileNotFoundError("Model for this lot has not been trained yet")
 
-    meta = joblib.load(meta_path)
-    cfg = LSTMConfig(n_features=len(meta["feature_cols"]))
-    model = OccupancyLSTM(cfg)
-    model.load_state_dict(torch.load(model_path, map_location="cpu"))
-    model.eval()
-    return model, meta
+    return _load_cached(lot_id, model_path.stat().st_mtime_ns)
 
 
-@router.get("/{lot_id}")
-def forecast_lot(lot_id: str):
+@router.on_event("startup")
+def _preload_models() -> None:
+    """Warm the cache so the first request per lot skips artifact loading."""
+    for path in ARTIFACT_DIR.glob("lot_*.int8.onnx"):
+        lot_id = path.name[len("lot_") : -len(".int8.onnx")]
+        try:
+            load_model_for_lot(lot_id)
+        except FileNotFoundError:
+            continue  # .pkl missing; trainable state will fix itself
+
+
+def _forecast_payload(lot_id: str) -> dict:
     try:
-        model, meta = load_model_for_lot(lot_id)
+        runner, meta = load_model_for_lot(lot_id)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Model not trained yet")
 
     seq_len = meta["seq_len"]
     freq_minutes = meta["freq_minutes"]
     horizons_hours: List[int] = meta["horizons_hours"]
-    feat_scaler = meta["feat_scaler"]
-    targ_scaler = meta["targ_scaler"]
 
     # Get enough recent data for one sequence
     df = fetch_timeseries(
@@ -57,31 +148,31 @@ def forecast_lot(lot_id: str):
 
     df_recent = df.iloc[-seq_len:]
     feature_cols = meta["feature_cols"]
-    feats = df_recent[feature_cols].values
-    scaled_feats = feat_scaler.transform(feats)
-    x = torch.from_numpy(scaled_feats.astype(np.float32))[None, :, :]  # (1,T,F)
+    feats = df_recent[feature_cols].values.astype(np.float32)
+    scaled_feats = (feats - meta["feat_min"]) * meta["feat_scale"]
+    x = scaled_feats[None, :, :]  # (1,T,F)
 
-    with torch.no_grad():
-        preds_scaled = model(x).numpy()[0]  # (4,)
+    preds_scaled = runner(x)[0]  # (4,)
 
-    # Inverse scale to avail_ratio
-    preds_ratio = targ_scaler.inverse_transform(preds_scaled.reshape(-1, 1))[:, 0]
+    # Inverse scale + clamp in one vectorized expression; the scaling
+    # coefficients come straight from the cached meta, avoiding
+    # MinMaxScaler.inverse_transform's reshape/validation path.
+    preds_ratio = np.clip(
+        preds_scaled / meta["targ_scale"] + meta["targ_min"], 0.0, 1.0
+    )
 
     last_row = df.iloc[-1]
     capacity = float(last_row["capacity"])
     last_ts = df.index[-1].to_pydatetime()
 
-    results = {}
-    for h, ratio in zip(horizons_hours, preds_ratio):
-        # clamp between 0 and 1
-        ratio = float(max(0.0, min(1.0, ratio)))
-        available_pred = int(round(capacity * ratio))
-        ts_pred = last_ts + timedelta(hours=h)
-        results[f"{h}h"] = {
-            "timestamp": ts_pred.isoformat(),
-            "available_pred": available_pred,
+    results = {
+        f"{h}h": {
+            "timestamp": (last_ts + timedelta(hours=h)).isoformat(),
+            "available_pred": int(round(capacity * ratio)),
             "avail_ratio_pred": ratio,
         }
+        for h, ratio in zip(horizons_hours, preds_ratio.tolist())
+    }
 
     return {
         "lot_id": lot_id,
@@ -89,3 +180,56 @@ def forecast_lot(lot_id: str):
         "capacity": int(capacity),
         "horizons": results,
     }
+
+
+def _artifact_mtime(lot_id: str):
+    for path in (
+        ARTIFACT_DIR / f"lot_{lot_id}.int8.onnx",
+        ARTIFACT_DIR / f"lot_{lot_id}.pt",
+    ):
+        if path.exists():
+            return path.stat().st_mtime_ns
+    return None
+
+
+@router.get("/{lot_id}")
+async def forecast_lot(lot_id: str, request: Request, response: Response):
+    etag = None
+    latest = db.get_latest(lot_id)
+    mtime = _artifact_mtime(lot_id)
+    if latest is not None and mtime is not None:
+        etag = f'W/"{lot_id}:{int(latest["timestamp"].timestamp())}:{mtime}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+        cached = _RESP_CACHE.get(lot_id)
+        if cached is not None and cached[0] == etag:
+            response.headers["ETag"] = etag
+            return cached[1]
+
+    loop = asyncio.get_running_loop()
+    payload = await loop.run_in_executor(_INFER_POOL, _forecast_payload, lot_id)
+    if etag is not None:
+        _RESP_CACHE[lot_id] = (etag, payload)
+        response.headers["ETag"] = etag
+    return payload
+
+
+@router.post("/batch")
+async def forecast_batch(lot_ids: List[str]):
+    """
+    Forecast several lots in one request. Models are trained per lot, so the
+    windows can't share a single stacked forward — the win here is paying the
+    HTTP + dispatch overhead once for a dashboard's worth of lots, with every
+    per-lot forward hitting the warm session cache.
+    """
+    loop = asyncio.get_running_loop()
+    forecasts = {}
+    errors = {}
+    for lot_id in dict.fromkeys(lot_ids):  # dedupe, keep order
+        try:
+            forecasts[lot_id] = await loop.run_in_executor(
+                _INFER_POOL, _forecast_payload, lot_id
+            )
+        except HTTPException as e:
+            errors[lot_id] = e.detail
+    return {"forecasts": forecasts, "errors": errors}
@@ -1,11 +1,11 @@
 # backend/ml/data_loader.py
 import os
-from typing import List, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine, text
-from sklearn.preprocessing import MinMaxScaler
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
@@ -33,6 +33,10 @@ def fetch_timeseries(
     freq_minutes: int = 15,
 ) -> pd.DataFrame:
     engine = get_engine()
+    # Cutoff is computed here and bound as a timestamptz param so the planner
+    # can range-scan ix_snap_lot_ts directly (server-side interval math forced
+    # an implicit cast that blocked the index).
+    cutoff = datetime.now(timezone.utc) - timedelta(days=lookback_days)
     query = text(
         """
         SELECT ts AS ts_utc,
@@ -40,37 +44,50 @@ def fetch_timeseries(
                total AS capacity
         FROM occupancy_snapshots
         WHERE lot_id = :lot_id
-          AND ts >= NOW() AT TIME ZONE 'UTC' - INTERVAL :days
+          AND ts >= :cutoff
         ORDER BY ts ASC;
         """
     )
 
     with engine.connect() as conn:
-        df = pd.read_sql(query, conn, params={"lot_id": lot_id, "days": f"{lookback_days} days"})
+        # Let read_sql build the datetime index directly: doing to_datetime +
+        # set_index afterwards re-converted and copied the whole frame.
+        df = pd.read_sql(
+            query,
+            conn,
+            params={"lot_id": lot_id, "cutoff": cutoff},
+            index_col="ts_utc",
+            parse_dates={"ts_utc": {"utc": True}},
+        )
 
     if df.empty:
         return df
 
-    df["ts_utc"] = pd.to_datetime(df["ts_utc"], utc=True)
-    df.set_index("ts_utc", inplace=True)
-
     # Resample to regular interval (forward fill last known occupancy)
     rule = f"{freq_minutes}T"
     df = df.resample(rule).ffill()
 
-    # Basic features
-    df["available"] = df["capacity"] - df["occupied"]
-    df["avail_ratio"] = df["available"] / df["capacity"].clip(lower=1)
+    # Basic features — float32 end-to-end: the scalers and the LSTM both run
+    # float32, so float64 Series here just double the pipeline's bandwidth.
+    cap = np.maximum(df["capacity"].to_numpy(), 1).astype(np.float32)
+    available = (df["capacity"].to_numpy() - df["occupied"].to_numpy()).astype(np.float32)
+    df["available"] = available
+    df["avail_ratio"] = available / cap
 
     # Time features
-    df["hour"] = df.index.hour
-    df["dow"] = df.index.dayofweek
-
-    # Cyclical encoding for hour/dow
-    df["hour_sin"] = np.sin(2 * np.pi * df["hour"] / 24)
-    df["hour_cos"] = np.cos(2 * np.pi * df["hour"] / 24)
-    df["dow_sin"] = np.sin(2 * np.pi * df["dow"] / 7)
-    df["dow_cos"] = np.cos(2 * np.pi * df["dow"] / 7)
+    hour = df.index.hour.to_numpy().astype(np.float32)
+    dow = df.index.dayofweek.to_numpy().astype(np.float32)
+    df["hour"] = hour
+    df["dow"] = dow
+
+    # Cyclical encoding: one shared radian array per period feeds both the
+    # sin and the cos instead of recomputing 2*pi*col/period four times.
+    th = np.float32(2 * np.pi / 24) * hour
+    td = np.float32(2 * np.pi / 7) * dow
+    df["hour_sin"] = np.sin(th)
+    df["hour_cos"] = np.cos(th)
+    df["dow_sin"] = np.sin(td)
+    df["dow_cos"] = np.cos(td)
 
     return df
 
@@ -80,11 +97,15 @@ def build_sequences(
     seq_len: int,
     horizons_hours: List[int],
     freq_minutes: int,
-) -> Tuple[np.ndarray, np.ndarray, MinMaxScaler, MinMaxScaler, List[str]]:
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray], List[str]]:
     """
     Converts the dataframe into (X, y) suitable for LSTM.
 
     y has shape (N, 4) for horizons [2h,4h,6h,8h] of *avail_ratio*.
+
+    Returns the min/max scaling coefficients as plain float32 arrays
+    (`scaled = (x - min) * scale`, `scale = 1/(max - min)`) so serving can
+    apply them as one multiply-add instead of going through sklearn.
     """
     if df.empty:
         raise ValueError("No data to build sequences")
@@ -99,28 +120,41 @@ def build_sequences(
         "dow_cos",
     ]
 
-    df_features = df[feature_cols].copy()
-
-    # Scale features and target [0,1]
-    feat_scaler = MinMaxScaler()
-    targ_scaler = MinMaxScaler()
-
-    scaled_features = feat_scaler.fit_transform(df_features.values)
-    target_vals = df[["avail_ratio"]].values
-    scaled_target = targ_scaler.fit_transform(target_vals)
+    # Scale features and target to [0,1] with manual min/max: sklearn's
+    # MinMaxScaler round-trips through float64 and re-validates per call.
+    feats = df[feature_cols].to_numpy(dtype=np.float32)
+    feat_min = feats.min(axis=0)
+    feat_scale = np.float32(1.0) / np.maximum(feats.max(axis=0) - feat_min, np.float32(1e-12))
+    scaled_features = (feats - feat_min) * feat_scale
+
+    target_vals = df[["avail_ratio"]].to_numpy(dtype=np.float32)
+    targ_min = float(target_vals.min())
+    targ_scale = float(1.0 / max(float(target_vals.max()) - targ_min, 1e-12))
+    scaled_target = (target_vals - np.float32(targ_min)) * np.float32(targ_scale)
+
+    scaling = {
+        "feat_min": feat_min,
+        "feat_scale": feat_scale,
+        "targ_min": targ_min,
+        "targ_scale": targ_scale,
+    }
 
     steps_per_hour = int(60 / freq_minutes)
     horizon_steps = [h * steps_per_hour for h in horizons_hours]
     max_h = max(horizon_steps)
 
-    X, y = [], []
-    for i in range(seq_len, len(df) - max_h):
-        # sequence [i-seq_len, i)
-        X.append(scaled_features[i - seq_len : i, :])
-        # targets at future horizons
-        y.append([scaled_target[i + hs, 0] for hs in horizon_steps])
+    n = len(scaled_features)
+    n_seq = max(n - seq_len - max_h, 0)
+
+    # Strided window view: row i aliases scaled_features[i : i+seq_len] with
+    # no copy, so building X is one contiguous copy instead of a Python loop
+    # of per-window slices. sliding_window_view puts the window axis last,
+    # hence the transpose back to (N, seq_len, F).
+    windows = np.lib.stride_tricks.sliding_window_view(scaled_features, seq_len, axis=0)
+    X = np.ascontiguousarray(windows[:n_seq].transpose(0, 2, 1), dtype=np.float32)
 
-    X = np.array(X, dtype=np.float32)
-    y = np.array(y, dtype=np.float32)
+    # Targets at each future horizon, gathered in one fancy-index op.
+    idx = np.arange(seq_len, seq_len + n_seq)[:, None] + np.asarray(horizon_steps)[None, :]
+    y = scaled_target[idx, 0].astype(np.float32)
 
-    return X, y, feat_scaler, targ_scaler, feature_cols
+    return X, y, scaling, feature_cols
@@ -35,8 +35,9 @@ class OccupancyLSTM(nn.Module):
 
     def forward(self, x):
         # x: (B, T, F)
-        out, _ = self.lstm(x)
-        # Use last time step
-        last_hidden = out[:, -1, :]  # (B, hidden)
+        # Only the final step matters, so read it from h_n instead of
+        # materializing the whole (B, T, H) per-step output tensor.
+        _, (h_n, _) = self.lstm(x)
+        last_hidden = h_n[-1]  # last layer's final hidden state: (B, hidden)
         preds = self.fc(last_hidden)  # (B, 4)
         return preds
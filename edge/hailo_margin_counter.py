@@ -3,6 +3,11 @@ import gi
 gi.require_version("Gst", "1.0")
 from gi.repository import Gst  # GLib not needed right now
 
+# Hoisted probe returns: app_callback hits one of these on every frame, and
+# each dotted form costs two attribute lookups.
+_OK = Gst.PadProbeReturn.OK
+_DROP = Gst.PadProbeReturn.DROP
+
 import os
 import sys
 import time
@@ -10,27 +15,44 @@ import argparse
 
 import cv2
 import hailo
+import numpy as np
 import threading
-import signal
+import queue
+import mmap
+import struct
 
-import math
-from collections import defaultdict, deque
+try:
+    import lap  # lapx — same JV solver ultralytics' trackers use
+except ImportError:
+    lap = None
 
 import json
+import logging
 from datetime import timezone, datetime
 from edge_outbox import EdgeOutbox
 from margin_core import MarginCounter
 
 from hailo_apps.hailo_app_python.core.common.buffer_utils import (
     get_caps_from_pad,
-    get_numpy_from_buffer,
 )
 from hailo_apps.hailo_app_python.core.gstreamer.gstreamer_app import app_callback_class
 from hailo_apps.hailo_app_python.apps.detection.detection_pipeline import (GStreamerDetectionApp,
 )
 
+log = logging.getLogger("hailo_margin")
+
+# Hot hailo accessors bound once: the detection loop resolves them as a
+# single global load instead of a module attribute chain per call.
+_GET_ROI = hailo.get_roi_from_buffer
+_HAILO_DET = hailo.HAILO_DETECTION
+_HAILO_UID = hailo.HAILO_UNIQUE_ID
+
 WATCHDOG_COUNT_FILE = "/tmp/hailo_edge_watchdog_count"
 
+# Labels counted as vehicles. Only "car" today, but membership is a hashed
+# frozenset lookup so widening it (truck/bus) stays O(1) in the hot loop.
+VEHICLE_LABELS = frozenset(("car",))
+
 STATE_DIR = Path("/home/ee96/Parking-Lot-Occupancy-Tracker/edge/state")
 LAST_STATE = STATE_DIR / "last.json"
 
@@ -42,69 +64,141 @@ def now_iso() -> str:
 def ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
+
+def frame_view(buffer, width, height):
+    """
+    Zero-copy RGB view of a GstBuffer: maps the buffer's memory and wraps it
+    with np.frombuffer instead of memcpy-ing ~6 MB per frame into a fresh
+    array. Returns (array, map_info); the caller must buffer.unmap(map_info)
+    as soon as it is done with the view.
+    """
+    success, info = buffer.map(Gst.MapFlags.READ)
+    if not success:
+        return None, None
+    arr = np.frombuffer(info.data, dtype=np.uint8)[: height * width * 3]
+    return arr.reshape(height, width, 3), info
+
+def _assign_greedy(cx, cy, tx, ty, max_dist):
+    """
+    Greedy nearest-track assignment on squared distances (no sqrt pass).
+    Returns the matched track index per detection, -1 for unmatched.
+
+    Kept as a pure arrays-in/arrays-out kernel: if the tracker ever shows
+    up in profiles it can be JIT-compiled wholesale without refactoring.
+    """
+    n_det = len(cx)
+    assigned = np.full(n_det, -1, dtype=np.int64)
+    if len(tx) == 0:
+        return assigned
+
+    # Centroids are int16; widen to int32 so the squared terms can't wrap.
+    dx = cx[:, None].astype(np.int32) - tx[None, :].astype(np.int32)
+    dy = cy[:, None].astype(np.int32) - ty[None, :].astype(np.int32)
+    d2 = dx * dx + dy * dy
+    limit = int(max_dist) * int(max_dist)
+    taken = np.iinfo(np.int32).max
+    for i in range(n_det):
+        j = int(np.argmin(d2[i]))
+        if d2[i, j] < limit:
+            assigned[i] = j
+            d2[:, j] = taken  # column is taken
+    return assigned
+
+
+# Above this many (track x detection) pairs, greedy matching both degrades
+# in quality and wastes work; hand the cost matrix to the JV solver instead.
+_OPTIMAL_ASSIGN_PAIRS = 400
+
+
+def _assign_optimal(cx, cy, tx, ty, max_dist):
+    """
+    Globally optimal assignment via lapx's Jonker-Volgenant solver.
+    Same contract as _assign_greedy; used for crowded frames.
+    """
+    dx = cx[:, None].astype(np.int32) - tx[None, :].astype(np.int32)
+    dy = cy[:, None].astype(np.int32) - ty[None, :].astype(np.int32)
+    d2 = (dx * dx + dy * dy).astype(np.float64)  # lapjv wants float costs
+    _, x, _ = lap.lapjv(d2, extend_cost=True, cost_limit=float(max_dist) ** 2)
+    return x.astype(np.int64)
+
+
 class SimpleTracker:
     """
     Very small centroid-based tracker.
     Keeps IDs stable across frames as long as objects move smoothly.
     Good enough for the gate-crossing logic.
+
+    Track state is kept in parallel NumPy arrays (ids/x/y/age) so the
+    per-frame distance computation is one broadcast instead of a Python
+    double loop over (track, detection) pairs.
     """
     def __init__(self, max_dist=80, max_age=20):
         self.next_id = 0
-        self.tracks = {}   # id -> {"cx":..., "cy":..., "age":...}
         self.max_dist = max_dist
         self.max_age = max_age
+        self._tids = np.empty(0, dtype=np.int64)
+        # Pixel centroids fit int16 at any sane frame size; squared-distance
+        # matching needs no sub-pixel precision and no sqrt.
+        self._tx = np.empty(0, dtype=np.int16)
+        self._ty = np.empty(0, dtype=np.int16)
+        self._age = np.empty(0, dtype=np.int32)
+
+    def _prune(self):
+        keep = self._age <= self.max_age
+        if not keep.all():
+            self._tids = self._tids[keep]
+            self._tx = self._tx[keep]
+            self._ty = self._ty[keep]
+            self._age = self._age[keep]
 
     def update(self, boxes):
         """
-        boxes: list of (x1, y1, x2, y2)
+        boxes: (N, 4) array (or sequence) of (x1, y1, x2, y2)
         returns: list of track_ids, same length as boxes
         """
-        if not boxes:
-            # Age all tracks, drop old ones
-            for tid in list(self.tracks.keys()):
-                self.tracks[tid]["age"] += 1
-                if self.tracks[tid]["age"] > self.max_age:
-                    del self.tracks[tid]
-            return []
-
-        centers = [((x1 + x2) * 0.5, (y1 + y2) * 0.5) for (x1, y1, x2, y2) in boxes]
-
         # Age existing tracks
-        for tid in list(self.tracks.keys()):
-            self.tracks[tid]["age"] += 1
+        self._age += 1
 
-        assigned_tracks = {}
-        used_tids = set()
+        if len(boxes) == 0:
+            self._prune()
+            return []
 
-        # Greedy nearest-neighbour assignment
-        for i, (cx, cy) in enumerate(centers):
-            best_tid = None
-            best_d = self.max_dist
-            for tid, trk in self.tracks.items():
-                if tid in used_tids:
-                    continue
-                d = math.hypot(cx - trk["cx"], cy - trk["cy"])
-                if d < best_d:
-                    best_d = d
-                    best_tid = tid
+        boxes_np = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        cx = ((boxes_np[:, 0] + boxes_np[:, 2]) * 0.5).astype(np.int16)
+        cy = ((boxes_np[:, 1] + boxes_np[:, 3]) * 0.5).astype(np.int16)
+        n_det = len(cx)
+
+        # Greedy assignment in detection order (same semantics as the old
+        # nested loop: each detection takes the nearest still-unused track
+        # within max_dist). Crowded frames go through the optimal solver,
+        # where greedy's order-dependence starts stealing tracks.
+        if lap is not None and n_det * len(self._tids) > _OPTIMAL_ASSIGN_PAIRS:
+            assigned = _assign_optimal(cx, cy, self._tx, self._ty, self.max_dist)
+        else:
+            assigned = _assign_greedy(cx, cy, self._tx, self._ty, self.max_dist)
 
-            if best_tid is None:
-                # create new track
-                best_tid = self.next_id
-                self.next_id += 1
+        matched = assigned >= 0
+        hit = assigned[matched]
+        self._tx[hit] = cx[matched]
+        self._ty[hit] = cy[matched]
+        self._age[hit] = 0
 
-            self.tracks[best_tid] = {"cx": cx, "cy": cy, "age": 0}
-            used_tids.add(best_tid)
-            assigned_tracks[i] = best_tid
+        out = np.empty(n_det, dtype=np.int64)
+        out[matched] = self._tids[hit]
 
-        # Drop stale tracks
-        self.tracks = {
-            tid: trk
-            for tid, trk in self.tracks.items()
-            if trk["age"] <= self.max_age
-        }
+        # New tracks for unmatched detections, appended in one batch
+        n_new = n_det - int(matched.sum())
+        if n_new:
+            new_ids = np.arange(self.next_id, self.next_id + n_new, dtype=np.int64)
+            self.next_id += n_new
+            out[~matched] = new_ids
+            self._tids = np.concatenate([self._tids, new_ids])
+            self._tx = np.concatenate([self._tx, cx[~matched]])
+            self._ty = np.concatenate([self._ty, cy[~matched]])
+            self._age = np.concatenate([self._age, np.zeros(n_new, dtype=np.int32)])
 
-        return [assigned_tracks.get(i, -1) for i in range(len(boxes))]
+        self._prune()
+        return out.tolist()
 
 
 
@@ -114,21 +208,45 @@ class SimpleTracker:
 class user_app_callback_class(app_callback_class):
     def __init__(self, args):
         super().__init__()
-        self.use_frame = True
+        self.use_frame = not getattr(args, "headless", False)
         self.args = args
         self.counter = None
         self.tracker = SimpleTracker(max_dist=90, max_age=60)
+
+        # Hailo-tracker trust: after enough consecutive frames with Hailo
+        # UNIQUE_IDs, stop falling back to SimpleTracker on transient gaps.
+        self._hailo_id_streak = 0
+        self._trust_hailo_ids = False
+
+        # Adaptive rate gate: when the measured per-frame processing cost
+        # says we're keeping up, every frame is processed (better tracker
+        # continuity); when we're falling behind, enforce the budget period
+        # and DROP the excess.
+        self._min_period = 1.0 / 10.0  # processing budget, ~10 FPS
+        self._last_processed = 0.0
+        self._proc_ema = 0.0  # smoothed seconds per processed frame
+
+        # Reused frame buffers: cvtColor writes into _bgr, and the bootstrap
+        # status frame is copied into _out, instead of allocating fresh
+        # W*H*3 frames 30x a second.
+        self._bgr = None
+        self._out = None
         
         # Bootstrap state for initial auto-occupancy
         self.start_ts = time.time()
         self.bootstrap_secs = getattr(args, "bootstrap_secs", 0.0)
         self.bootstrap_offset = getattr(args, "bootstrap_offset", 0)
-        self.bootstrap_ids = set()  # unique track ids seen in scan ROI
+        # Unique track ids seen in the scan ROI, as a boolean bitset indexed
+        # by track id (Hailo UNIQUE_IDs are small ints) — marking a frame's
+        # worth is one fancy-index store, counting is one sum.
+        self.bootstrap_seen = np.zeros(4096, dtype=bool)
         # If bootstrap_secs <= 0, we skip bootstrapping
         self.bootstrap_done = (self.bootstrap_secs <= 0.0)
 
 
-        # Watchdog: last time we got a good frame
+        # Watchdog: set on every good frame; the watchdog thread blocks on it
+        # instead of polling a timestamp once a second.
+        self._frame_event = threading.Event()
         self.last_frame_ts = time.time()
 
         # Start watchdog thread
@@ -138,77 +256,118 @@ class user_app_callback_class(app_callback_class):
         # Outbox: local SQLite buffer + background sync to backend
         self.outbox = EdgeOutbox()
 
-        # Define the hook that MarginCounter will call on each +1/-1 event
+        # Occupancy events are queued and persisted by a dedicated writer
+        # thread: an SQLite lock or SD-card stall on the pipeline thread
+        # would block frame processing and can trip the 20 s watchdog.
+        self._occ_queue = queue.Queue(maxsize=1024)
+        self._last_persisted_occ = None  # skip rewriting last.json when equal
+        threading.Thread(target=self._occ_writer, daemon=True).start()
+
+        # Hook that MarginCounter calls on each +1/-1 event (pipeline thread:
+        # just normalize and enqueue, no I/O here)
         def _on_occ(ts_utc, occupancy_after, max_capacity):
-            # Always normalize to UTC ISO string
             ts_iso = ts_utc.astimezone(timezone.utc).isoformat()
-            # 1) Persist into the outbox / DB
-            try:
-                self.outbox.insert_detection(ts_iso, occupancy_after, max_capacity)
-            except Exception as e:
-                # Don't kill the pipeline on DB errors
-                print(f"[OUTBOX ERROR] {e}", file=sys.stderr)
-
-            # 2) Persist "last known occupancy" for crash/reboot resume
+            item = (ts_iso, int(occupancy_after), int(max_capacity))
             try:
-                ensure_dir(STATE_DIR)
-                LAST_STATE.write_text(
-                    json.dumps(
-                        {
-                            "ts": ts_iso,
-                            "occupancy": int(occupancy_after),
-                        }
-                    ),
-                    encoding="utf-8",
-                )
-            except Exception as e:
-                # Just log; don't crash the pipeline
-                print(
-                    json.dumps(
-                        {"ts": now_iso(), "persist_error": str(e)}
-                    ),
-                    file=sys.stderr,
-                )
+                self._occ_queue.put_nowait(item)
+            except queue.Full:
+                # Drop the oldest event: the latest occupancy wins, and
+                # blocking the pipeline thread is the one thing we must not do
+                try:
+                    self._occ_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    self._occ_queue.put_nowait(item)
+                except queue.Full:
+                    pass
 
         self.on_occupancy_update = _on_occ
 
         # Fire up background sync thread (no-op if EDGE_INGEST_URL unset)
         self.outbox.start_background_sync()
 
+    def _occ_writer(self):
+        """Drains the occupancy queue off the pipeline thread."""
+        while True:
+            ts_iso, occ, cap = self._occ_queue.get()
+            # 1) Persist into the outbox / DB
+            try:
+                self.outbox.insert_detection(ts_iso, occ, cap)
+            except Exception as e:
+                # Don't kill the writer on DB errors
+                log.error("[OUTBOX ERROR] %s", e)
+
+            # 2) Persist "last known occupancy" for crash/reboot resume.
+            # Unchanged occupancy is skipped, and the write goes through a
+            # temp file + os.replace so a crash mid-write can never leave a
+            # truncated last.json.
+            if occ == self._last_persisted_occ:
+                continue
+            try:
+                ensure_dir(STATE_DIR)
+                payload = b'{"ts": "%s", "occupancy": %d}' % (ts_iso.encode(), occ)
+                tmp = LAST_STATE.with_suffix(".tmp")
+                tmp.write_bytes(payload)
+                os.replace(tmp, LAST_STATE)
+                self._last_persisted_occ = occ
+            except Exception as e:
+                log.error("persist_error: %s", e)
+
     def _watchdog_loop(self):
         timeout = 20.0  # seconds with no new frames before we say "frozen"
+
+        # Freeze counter lives in an 8-byte mmap: bumping it is an in-place
+        # pack_into, not an open/read/write cycle per trigger. (Re)initialize
+        # if the file is missing or still in the old text format.
+        mm = None
+        try:
+            fd = os.open(WATCHDOG_COUNT_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size != 8:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, 8)
+                mm = mmap.mmap(fd, 8)
+            finally:
+                os.close(fd)
+        except Exception:
+            mm = None
+        fallback_count = 0  # in-process counter if the mmap failed
+
         while True:
-            time.sleep(1.0)
+            # Blocks until app_callback signals a frame or the timeout hits;
+            # no once-a-second wakeups while frames are flowing.
+            if self._frame_event.wait(timeout):
+                self._frame_event.clear()
+                continue
+
             since = time.time() - self.last_frame_ts
             if since > timeout:
-                # Read current freeze count from file
-                try:
-                    with open(WATCHDOG_COUNT_FILE, "r") as f:
-                        count = int(f.read().strip() or "0")
-                except Exception:
-                    count = 0
-
-                count += 1
-                try:
-                    with open(WATCHDOG_COUNT_FILE, "w") as f:
-                        f.write(str(count))
-                except Exception:
-                    pass
+                if mm is not None:
+                    count = struct.unpack_from("<Q", mm, 0)[0] + 1
+                    struct.pack_into("<Q", mm, 0, count)
+                else:
+                    # Can't persist across restarts; count in-process so the
+                    # escalation stays restart-first instead of a bad /tmp
+                    # file turning every freeze into a reboot.
+                    fallback_count += 1
+                    count = fallback_count
 
-                print(f"Watchdog: no frames for {since:.1f}s (freeze #{count})")
+                log.warning("Watchdog: no frames for %.1fs (freeze #%d)", since, count)
 
+                # Wrapper contract: exit 200 = reboot the box, exit 201 =
+                # just restart this script.
                 if count >= 3:
                     # 3rd freeze in this boot: tell outer loop to reboot
-                    print("Watchdog: hit 3 freezes, exiting with code 200 for reboot...")
+                    log.warning("Watchdog: hit 3 freezes, exiting with code 200 for reboot...")
                     os._exit(200)  # exit immediately with special code
                 else:
-                    # 1st or 2nd freeze: simulate your double Ctrl+C and let wrapper restart
-                    pid = os.getpid()
-                    print("Watchdog: sending SIGINT x2 to self")
-                    os.kill(pid, signal.SIGINT)
-                    time.sleep(1.5)
-                    os.kill(pid, signal.SIGINT)
-                    break
+                    # 1st or 2nd freeze: exit immediately for a wrapper
+                    # restart. The old SIGINT-x2 dance cost 1.5 s of sleep
+                    # and raced against uninterruptible GStreamer/Hailo
+                    # calls that could swallow the signal.
+                    log.warning("Watchdog: exiting with code 201 for restart...")
+                    os._exit(201)
 
 
                 
@@ -219,93 +378,110 @@ def app_callback(pad, info, user_data):
     # Get the GstBuffer from the probe info
     buffer = info.get_buffer()
     if buffer is None:
-        return Gst.PadProbeReturn.OK
-        
+        return _OK
+
+    # Bind the per-frame hot attributes once; every `user_data.` below is a
+    # __getattribute__ call in code that runs 10x a second.
+    args = user_data.args
+
+    # One clock read per callback: it feeds the watchdog, the bootstrap
+    # window, and MarginCounter alike.
+    t_now = time.time()
+
     # mark that we saw a frame
-    user_data.last_frame_ts = time.time()
+    user_data.last_frame_ts = t_now
+    user_data._frame_event.set()
 
     # Increment internal frame counter
     user_data.increment()
-    
-    # FPS ~10
-    user_data.frame_index = getattr(user_data, "frame_index", 0) + 1
-    if user_data.frame_index % 2 != 0:
-        # Skip processing every other frame
-        return Gst.PadProbeReturn.OK
+
+    # Rate gate: only throttle when the smoothed processing cost is close to
+    # the frame budget — under light load every frame is processed, under
+    # load the excess is DROPped so latency can't pile up behind process().
+    now_m = time.monotonic()
+    if (
+        user_data._proc_ema > user_data._min_period * 0.9
+        and now_m - user_data._last_processed < user_data._min_period
+    ):
+        return _DROP
+    user_data._last_processed = now_m
 
     # Get caps and frame metadata
     fmt, width, height = get_caps_from_pad(pad)
     if fmt is None or width is None or height is None:
-        return Gst.PadProbeReturn.OK
+        return _OK
 
-    # Get video frame (RGB) and convert to BGR for OpenCV / MarginCounter
-    frame_rgb = None
+    # Headless deploys never touch pixels: detection metadata, tracking,
+    # counting and the outbox all run without mapping the frame, dropping
+    # the whole per-frame memory-bandwidth cost of the display path.
+    frame_bgr = None
     if user_data.use_frame:
-        frame_rgb = get_numpy_from_buffer(buffer, fmt, width, height)
+        # Get video frame (RGB) as a zero-copy view of the pipeline buffer —
+        # valid only until the unmap below.
+        frame_rgb, map_info = frame_view(buffer, width, height)
+        if frame_rgb is None:
+            return _OK
 
-    if frame_rgb is None:
-        return Gst.PadProbeReturn.OK
+        # Convert into a preallocated buffer — the drawing code needs
+        # contiguous memory (so no [..., ::-1] view) and the display branch
+        # expects BGR, but the per-frame output allocation is pure churn.
+        if user_data._bgr is None or user_data._bgr.shape != frame_rgb.shape:
+            user_data._bgr = np.empty_like(frame_rgb)
+        frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR, dst=user_data._bgr)
 
-    frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
-    
-    # Optional horizontal flip so User Frame is unmirrored
-    if user_data.args.flip_user_frame:
-        frame_bgr = cv2.flip(frame_bgr, 1)
+        # The BGR copy is ours now; hand the pipeline buffer back immediately.
+        buffer.unmap(map_info)
 
+        # Optional horizontal flip so User Frame is unmirrored
+        if args.flip_user_frame:
+            frame_bgr = cv2.flip(frame_bgr, 1)
 
-    # Mark that we successfully got a frame
-    user_data.last_frame_ts = time.time()
+    frame_shape = (height, width, 3)
 
     # Lazily create MarginCounter when we know frame shape
     if user_data.counter is None:
-        user_data.counter = MarginCounter(user_data.args, frame_bgr.shape)
+        user_data.counter = MarginCounter(args, frame_shape)
 
         # Wire occupancy callback → SQLite outbox
         if getattr(user_data, "on_occupancy_update", None):
             user_data.counter.on_occupancy_update = user_data.on_occupancy_update
 
-    t_now = time.time()
-
     # Get detections from Hailo ROI
-    roi = hailo.get_roi_from_buffer(buffer)
-    hailo_dets = roi.get_objects_typed(hailo.HAILO_DETECTION)
+    roi = _GET_ROI(buffer)
+    hailo_dets = roi.get_objects_typed(_HAILO_DET)
 
-    # Collect boxes + confidences + IDs for vehicle-like classes
-    raw_boxes = []
+    # Collect boxes + confidences + IDs for vehicle-like classes. Coordinates
+    # stay normalized inside the loop; the pixel conversion happens once in
+    # NumPy below instead of eight Python float multiplies per detection.
+    raw_norm  = []
     raw_confs = []
     raw_ids   = []   # Hailo tracker IDs
+    has_hailo_id = False  # set during the pass; replaces a second any() scan
 
     for det in hailo_dets:
-        label = det.get_label()
-        conf = det.get_confidence()
-        bbox = det.get_bbox()
-
-        # Only keep cars from the beginning
-        if label != "car":
+        if det.get_label() not in VEHICLE_LABELS:
             continue
 
-        # Hailo bbox is normalized 0–1 → convert to pixel coords
-        x1n, y1n, x2n, y2n = (
-            bbox.xmin(),
-            bbox.ymin(),
-            bbox.xmax(),
-            bbox.ymax(),
-        )
-        x1 = float(x1n * width)
-        y1 = float(y1n * height)
-        x2 = float(x2n * width)
-        y2 = float(y2n * height)
-
-        raw_boxes.append((x1, y1, x2, y2))
-        raw_confs.append(float(conf))
+        bbox = det.get_bbox()
+        raw_norm.append((bbox.xmin(), bbox.ymin(), bbox.xmax(), bbox.ymax()))
+        raw_confs.append(float(det.get_confidence()))
 
         # 🔹 Get Hailo's UNIQUE_ID (track ID) for this car
-        uid_objs = det.get_objects_typed(hailo.HAILO_UNIQUE_ID)
+        uid_objs = det.get_objects_typed(_HAILO_UID)
         if uid_objs and len(uid_objs) > 0:
-            tid = uid_objs[0].get_id()
+            tid = int(uid_objs[0].get_id())
+            if tid >= 0:
+                has_hailo_id = True
         else:
             tid = -1  # tracker didn't tag this detection
-        raw_ids.append(int(tid))
+        raw_ids.append(tid)
+
+    # Normalized 0–1 → pixel coords in one broadcast multiply
+    if raw_norm:
+        scale_wh = np.array([width, height, width, height], dtype=np.float32)
+        raw_boxes = np.asarray(raw_norm, dtype=np.float32) * scale_wh
+    else:
+        raw_boxes = np.empty((0, 4), dtype=np.float32)
 
     # ---------------------------------------------
     # ROI filter: keep only boxes in top 30% of frame
@@ -328,21 +504,25 @@ def app_callback(pad, info, user_data):
     # print("raw_boxes in this frame:", len(raw_boxes))
 
     # If we flipped the image, flip the boxes so coords still align
-    if user_data.args.flip_user_frame and raw_boxes:
-        flipped_boxes = []
-        for (x1, y1, x2, y2) in raw_boxes:
-            fx1 = width - x2
-            fx2 = width - x1
-            flipped_boxes.append((fx1, y1, fx2, y2))
-        raw_boxes = flipped_boxes
-
-    # Prefer Hailo tracker IDs; fallback to SimpleTracker if none
-    if raw_ids and any(tid >= 0 for tid in raw_ids):
+    # (two vectorized column ops, x1/x2 swap included)
+    if args.flip_user_frame and len(raw_boxes):
+        raw_boxes[:, [0, 2]] = width - raw_boxes[:, [2, 0]]
+
+    # Prefer Hailo tracker IDs; fallback to SimpleTracker if none. After 30
+    # consecutive frames of Hailo ids we trust them outright and never mix
+    # in SimpleTracker ids again — its id space is unrelated, and a one-frame
+    # gap would otherwise hand the gate logic colliding track ids.
+    if has_hailo_id:
         track_ids = raw_ids
-        #print("USING HAILO TRACKER IDs:", track_ids)
+        if not user_data._trust_hailo_ids:
+            user_data._hailo_id_streak += 1
+            if user_data._hailo_id_streak >= 30:
+                user_data._trust_hailo_ids = True
+    elif user_data._trust_hailo_ids or not raw_ids:
+        track_ids = raw_ids  # untagged dets drop out in the keep mask below
     else:
+        user_data._hailo_id_streak = 0
         track_ids = user_data.tracker.update(raw_boxes)
-        #print("USING SIMPLETRACKER IDs:", track_ids)
         
     #if track_ids:
         #print("Track IDs this frame:", track_ids)
@@ -350,25 +530,22 @@ def app_callback(pad, info, user_data):
     # DEBUG: show the IDs we assigned
     # print("assigned track_ids:", track_ids)
 
-    detections = []
-    for (x1, y1, x2, y2), conf, tid in zip(raw_boxes, raw_confs, track_ids):
-        if tid < 0:
-            continue
-
-        # Map all vehicles to class 2 ("car") for MarginCounter logic
-        detections.append(
-            {
-                "id": int(tid),
-                "cls": 2,
-                "conf": conf,
-                "xyxy": (x1, y1, x2, y2),
-            }
-        )
-
-    # DEBUG: how many detections will MarginCounter see?
-    # print("detections passed to MarginCounter:", len(detections))
+    # SoA detection arrays: one id/box/conf array triple per frame instead of
+    # a freshly allocated dict per detection. MarginCounter.process accepts
+    # this tuple contract directly (all vehicles count as class "car").
+    if len(raw_boxes):
+        ids_np = np.fromiter(track_ids, dtype=np.int32, count=len(track_ids))
+        keep = ids_np >= 0
+        ids_np = ids_np[keep]
+        xyxy_np = raw_boxes[keep]
+        confs_np = np.asarray(raw_confs, dtype=np.float32)[keep]
+    else:
+        ids_np = np.empty(0, dtype=np.int32)
+        xyxy_np = np.empty((0, 4), dtype=np.float32)
+        confs_np = np.empty(0, dtype=np.float32)
+    detections = (ids_np, xyxy_np, confs_np)
 
-    h, w = frame_out.shape[:2] if 'frame_out' in locals() else frame_bgr.shape[:2]
+    h, w = height, width
 
     elapsed = t_now - user_data.start_ts
 
@@ -377,41 +554,58 @@ def app_callback(pad, info, user_data):
     # -------------------------------------------------------------
     if not user_data.bootstrap_done:
         # Determine scan ROI
-        sxmin = max(0, user_data.args.scan_xmin)
-        sxmax = user_data.args.scan_xmax if user_data.args.scan_xmax > 0 else w
-        symin = max(0, user_data.args.scan_ymin)
-        symax = user_data.args.scan_ymax if user_data.args.scan_ymax > 0 else h
-
-        for det in detections:
-            x1, y1, x2, y2 = det["xyxy"]
-            tid = det["id"]
-            cx = 0.5 * (x1 + x2)
-            cy = 0.5 * (y1 + y2)
-            if sxmin <= cx <= sxmax and symin <= cy <= symax:
-                user_data.bootstrap_ids.add(tid)
+        sxmin = max(0, args.scan_xmin)
+        sxmax = args.scan_xmax if args.scan_xmax > 0 else w
+        symin = max(0, args.scan_ymin)
+        symax = args.scan_ymax if args.scan_ymax > 0 else h
+
+        if len(ids_np):
+            cx = (xyxy_np[:, 0] + xyxy_np[:, 2]) * 0.5
+            cy = (xyxy_np[:, 1] + xyxy_np[:, 3]) * 0.5
+            in_roi = (cx >= sxmin) & (cx <= sxmax) & (cy >= symin) & (cy <= symax)
+            seen_ids = ids_np[in_roi]
+            if seen_ids.size:
+                top = int(seen_ids.max())
+                if top >= user_data.bootstrap_seen.size:
+                    grown = np.zeros(top * 2, dtype=bool)
+                    grown[: user_data.bootstrap_seen.size] = user_data.bootstrap_seen
+                    user_data.bootstrap_seen = grown
+                user_data.bootstrap_seen[seen_ids] = True
 
         if elapsed >= user_data.bootstrap_secs:
-            auto_count = len(user_data.bootstrap_ids)
+            auto_count = int(user_data.bootstrap_seen.sum())
             seed = auto_count + user_data.bootstrap_offset
-            user_data.args.seed_occupancy = seed
-            print(f"[BOOTSTRAP] auto_count={auto_count}, offset={user_data.bootstrap_offset}, seed_occupancy={seed}")
-            user_data.counter = MarginCounter(user_data.args, frame_bgr.shape)
-            # re-attach occupancy hook
-            if getattr(user_data, "on_occupancy_update", None):
-                user_data.counter.on_occupancy_update = user_data.on_occupancy_update
+            args.seed_occupancy = seed
+            log.info(
+                "[BOOTSTRAP] auto_count=%d, offset=%d, seed_occupancy=%d",
+                auto_count, user_data.bootstrap_offset, seed,
+            )
+            # Reseed the live counter in place; its gates, hook wiring and
+            # scratch buffers carry over from the lazy creation above.
+            if user_data.counter is not None:
+                user_data.counter.reseed(seed)
+            else:
+                user_data.counter = MarginCounter(args, frame_shape)
+                if getattr(user_data, "on_occupancy_update", None):
+                    user_data.counter.on_occupancy_update = user_data.on_occupancy_update
             user_data.bootstrap_done = True
 
 
     # If bootstrap is disabled or done and we somehow still don't have a counter, create it now
     if user_data.bootstrap_done and user_data.counter is None:
-        user_data.counter = MarginCounter(user_data.args, frame_bgr.shape)
+        user_data.counter = MarginCounter(args, frame_shape)
         if getattr(user_data, "on_occupancy_update", None):
             user_data.counter.on_occupancy_update = user_data.on_occupancy_update
 
 
     # If we are still in the bootstrap window (no counter yet), just display status text
     if user_data.counter is None:
-        frame_out = frame_bgr.copy()
+        if frame_bgr is None:
+            return _OK
+        if user_data._out is None or user_data._out.shape != frame_bgr.shape:
+            user_data._out = np.empty_like(frame_bgr)
+        np.copyto(user_data._out, frame_bgr)
+        frame_out = user_data._out
         cv2.putText(
             frame_out,
             f"Bootstrapping occupancy... {elapsed:.1f}/{user_data.bootstrap_secs:.1f}s",
@@ -424,7 +618,7 @@ def app_callback(pad, info, user_data):
         )
         cv2.putText(
             frame_out,
-            f"Scan count so far: {len(user_data.bootstrap_ids)}",
+            f"Scan count so far: {int(user_data.bootstrap_seen.sum())}",
             (20, 80),
             cv2.FONT_HERSHEY_SIMPLEX,
             1.0,
@@ -433,7 +627,7 @@ def app_callback(pad, info, user_data):
             cv2.LINE_AA,
         )
         user_data.set_frame(frame_out)
-        return Gst.PadProbeReturn.OK
+        return _OK
 
 
     # Run shared margin logic (updates occupancy, HUD, etc.)
@@ -462,12 +656,6 @@ def app_callback(pad, info, user_data):
             # cv2.LINE_AA,
         # )
 
-    # ------------------------------------------------------------------
-    # Draw gate masks directly here (Hailo overlay), independent of margin_core
-    # ------------------------------------------------------------------
-    args = user_data.args
-    h, w = frame_out.shape[:2]
-
     # ------------------------------------------------------------------
     # Flip output horizontally (mirror) so orientation matches CPU script
     # ------------------------------------------------------------------
@@ -494,9 +682,43 @@ def app_callback(pad, info, user_data):
     # )
 
     # Give annotated frame back to app for display
-    user_data.set_frame(frame_out)
+    if frame_out is not None:
+        user_data.set_frame(frame_out)
+
+    # Fold this frame's processing cost into the EMA driving the rate gate
+    user_data._proc_ema = (
+        0.9 * user_data._proc_ema + 0.1 * (time.monotonic() - now_m)
+    )
+
+    return _OK
+
 
-    return Gst.PadProbeReturn.OK
+def tune_pipeline_latency(app) -> None:
+    """
+    Clamp queue depths across the detection pipeline so frames never back up
+    between capture and app_callback: under overload we drop a frame instead
+    of accumulating hundreds of ms of latency (which also keeps the watchdog
+    from tripping on a backlog rather than a real freeze).
+    """
+    pipeline = getattr(app, "pipeline", None)
+    if pipeline is None:
+        return
+    it = pipeline.iterate_recurse()
+    while True:
+        result, elem = it.next()
+        if result != Gst.IteratorResult.OK:
+            break
+        factory = elem.get_factory()
+        kind = factory.get_name() if factory is not None else ""
+        if kind == "appsink":
+            elem.set_property("max-buffers", 1)
+            elem.set_property("drop", True)
+            elem.set_property("sync", False)
+        elif kind == "queue":
+            elem.set_property("leaky", 2)  # downstream: drop oldest
+            elem.set_property("max-size-buffers", 1)
+            elem.set_property("max-size-time", 0)
+            elem.set_property("max-size-bytes", 0)
 
 
 # -----------------------------------------------------------------------------------
@@ -584,6 +806,10 @@ if __name__ == "__main__":
     parser.add_argument("--max_capacity", type=int, default=73)
     parser.add_argument("--debug_hits", action="store_true")
 
+    # Headless: run detections -> tracker -> counter -> outbox without ever
+    # mapping, converting, or drawing a frame.
+    parser.add_argument("--headless", action="store_true")
+
     # Control gate mask opacity on Hailo output
     parser.add_argument("--mask_alpha", type=float, default=0.0) # 0.25
 
@@ -598,9 +824,16 @@ if __name__ == "__main__":
     # only sees its own flags.
     sys.argv = [sys.argv[0]] + remaining
 
-    # Always show overlays in this script
-    args.display = True
-    args.show_labels = True
+    # Lazy %s-style logging; DEBUG only when asked, so accidentally
+    # re-enabled per-frame diagnostics stay free in production.
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug_hits else logging.INFO,
+        format="%(asctime)s %(name)s %(levelname)s %(message)s",
+    )
+
+    # Show overlays unless running headless
+    args.display = not args.headless
+    args.show_labels = not args.headless
 
     # Point Hailo runtime at the examples .env (same as original detection.py)
     hailo_root = Path("/home/ee96/hailo-rpi5-examples")
@@ -618,6 +851,13 @@ if __name__ == "__main__":
 
     print("GStreamerDetectionApp created")
 
+    try:
+        tune_pipeline_latency(app)
+        log.info("Pipeline queues tuned for low latency")
+    except Exception as e:
+        # Non-fatal: default queue depths just mean more latency
+        log.warning("Could not tune pipeline queues: %r", e)
+
     try:
         print("Calling app.run() ...")
         app.run()
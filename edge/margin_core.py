@@ -1,19 +1,34 @@
 # margin_core.py
 
 import json
-from collections import defaultdict, deque
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from itertools import islice
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 import cv2
 import numpy as np
 
 
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# event timestamps are logged in campus-local time; resolve the zone once
+_TZ_NY = ZoneInfo("America/New_York")
+
+# region / origin_side codes for Gate's per-track state arrays
+# (_INSIDE doubles as "no origin yet" for origin_side)
+_INSIDE, _ABOVE, _BELOW = 0, 1, 2
+
+
 def put(frame, txt, org, scale=0.55, color=(255, 255, 0), thick=2):
     cv2.putText(
         frame,
         txt,
         org,
-        cv2.FONT_HERSHEY_SIMPLEX,
+        FONT,
         scale,
         color,
         thick,
@@ -37,33 +52,66 @@ class Gate:
         self.B = 0
         self.xmin, self.xmax = 0, w - 1
 
-        # per-track state:
-        #   y_prev/t_prev: last reference Y + time
-        #   region: 'above' / 'inside' / 'below'
-        #   in_band: True while we are inside [A,B]
-        #   origin_side: 'above' or 'below' – where we came from when we entered band
-        self.state = defaultdict(
-            lambda: {
-                "y_prev": None,
-                "t_prev": 0.0,
-                "region": "inside",
-                "in_band": False,
-                "origin_side": None,
-            }
-        )
-
-        # per-track cooldown timer for events
-        self.last_event_at = defaultdict(lambda: 0.0)
+        # per-track state, struct-of-arrays indexed by slot (see slot_for):
+        #   y_prev/t_prev:  last reference Y + time (y_prev NaN until first seen)
+        #   region:         _ABOVE / _INSIDE / _BELOW code
+        #   in_band:        True while we are inside [A,B]
+        #   origin_side:    _ABOVE/_BELOW we entered the band from (_INSIDE = none)
+        #   last_event_at:  per-track cooldown timer for events
+        # A dict-of-dicts here costs a dict alloc + five boxed values per new
+        # track and a hash probe per field access; flat arrays keep the whole
+        # state machine in six cache-friendly buffers.
+        cap = 256
+        self._slots = {}  # tid -> row in the arrays below
+        self.y_prev = np.full(cap, np.nan, dtype=np.float32)
+        self.t_prev = np.zeros(cap, dtype=np.float64)
+        self.region = np.zeros(cap, dtype=np.int8)
+        self.in_band = np.zeros(cap, dtype=bool)
+        self.origin_side = np.zeros(cap, dtype=np.int8)
+        self.last_event_at = np.zeros(cap, dtype=np.float64)
+
+        # cached top/bot — band geometry only changes via set_band()/refresh(),
+        # so the per-detection loop reads attributes instead of min()/max()
+        self.refresh()
+
+    def slot_for(self, tid):
+        """Return this track's row in the state arrays, allocating on first use."""
+        s = self._slots.get(tid)
+        if s is None:
+            s = len(self._slots)
+            if s >= self.y_prev.size:
+                self._grow()
+            self._slots[tid] = s
+        return s
+
+    def _grow(self):
+        cap = self.y_prev.size * 2
+        for name in (
+            "y_prev", "t_prev", "region", "in_band", "origin_side", "last_event_at"
+        ):
+            old = getattr(self, name)
+            if name == "y_prev":
+                grown = np.full(cap, np.nan, dtype=old.dtype)
+            else:
+                grown = np.zeros(cap, dtype=old.dtype)
+            grown[: old.size] = old
+            setattr(self, name, grown)
+
+    def refresh(self):
+        """Recompute the cached _top/_bot after mutating A/B directly."""
+        self._top = min(self.A, self.B)
+        self._bot = max(self.A, self.B)
 
     def set_band(self, A, B):
         self.A = float(A)
         self.B = float(B)
+        self.refresh()
 
     def top(self):
-        return min(self.A, self.B)
+        return self._top
 
     def bot(self):
-        return max(self.A, self.B)
+        return self._bot
 
 
 class MarginCounter:
@@ -105,44 +153,165 @@ class MarginCounter:
         self.gate2.xmin = max(0, int(args.g2_xmin))
         self.gate2.xmax = min(w - 1, int(args.g2_xmax))
 
+        self.gate1.refresh()
+        self.gate2.refresh()
+
         self.gates = [self.gate1, self.gate2]
         self.active_gate_idx = 0  # just for highlighting in HUD
 
+        # config knobs, resolved once — args never change after startup, so
+        # there is no reason to re-run ~15 getattr() lookups every frame
+        self.yref_mode = getattr(args, "yref", "topq")
+        self.min_speed = float(getattr(args, "min_speed", 0.1))
+        self.max_speed_px_s = float(getattr(args, "max_speed_px_s", 0.0))
+        self.cooldown_s = float(getattr(args, "cooldown_s", 0.0))
+        self.hyst_px = int(getattr(args, "hyst_px", 2))
+        # min_track_age & implied_seq are ignored in this simplified logic
+        self.invert_dir = bool(getattr(args, "invert_dir", False))
+        self.min_box_w = int(getattr(args, "min_box_w", 3))
+        self.min_box_h = int(getattr(args, "min_box_h", 3))
+        self.max_ar = float(getattr(args, "max_ar", 5.0))
+        self.max_capacity = int(getattr(args, "max_capacity", 73))
+        self.show_labels = bool(getattr(args, "show_labels", True))
+        self.debug_hits = bool(getattr(args, "debug_hits", False))
+        self.display = bool(getattr(args, "display", True))
+
+        # mask opacity; >0 means we draw the semi-transparent gate bands
+        self.mask_alpha = float(getattr(args, "mask_alpha", 0.25))
+
         # recent events for HUD ticker
         self.events_recent = deque(maxlen=8)
 
         # optional hook for DB / telemetry
         self.on_occupancy_update = None
 
+        # event log lines go through a queue to a daemon writer, so the
+        # frame thread never serializes JSON or blocks on stdout
+        self._log_q = queue.SimpleQueue()
+        threading.Thread(target=self._log_loop, daemon=True).start()
+
+        # pre-rendered per-gate color tiles for the semi-transparent masks;
+        # blending each gate's ROI slice against its tile moves ~band-area
+        # bytes instead of the old full-frame copy + full-frame addWeighted
+        self._band_tiles = [
+            np.full(
+                (int(g._bot) - int(g._top) + 1, int(g.xmax) - int(g.xmin) + 1, 3),
+                (0, 255, 255),
+                dtype=np.uint8,
+            )
+            for g in self.gates
+        ]
+
+        # HUD strings: gate geometry is fixed after init and occupancy only
+        # changes on events, so the labels are cached rather than re-built
+        # (f-string formatting included) every frame
+        self._gate_labels = [
+            f"{g.name} A={g._top}px B={g._bot}px X=[{g.xmin},{g.xmax}]"
+            for g in self.gates
+        ]
+        self._occ_label = (None, "")
+
+    def reseed(self, seed_occupancy: int) -> None:
+        """
+        Reset the running count in place (bootstrap completion), instead of
+        tearing down and rebuilding the whole counter. The seeded value is
+        pushed to the hook once on the next process() call.
+        """
+        self.occupancy = int(seed_occupancy)
+        self.bootstrap_done = True
+        self._initial_pushed = False
+
+    def _log_loop(self):
+        """Drain queued log records and write them to stdout in batches."""
+        q = self._log_q
+        out = sys.stdout.buffer
+        while True:
+            batch = [q.get()]  # block until there is something to write
+            time.sleep(0.01)   # let same-frame records coalesce
+            while True:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            out.write(b"\n".join(json.dumps(o).encode() for o in batch) + b"\n")
+            out.flush()
+
+    def _emit_event(self, frame_ts, tid, cid, vy, yR, delta):
+        """Update occupancy and record an event.
+
+        `frame_ts` is the caller's per-frame timestamp cache (see process());
+        every event in a frame shares one formatted timestamp triple.
+        """
+        before = self.occupancy
+        after = before + (1 if delta > 0 else -1)
+        after = max(0, min(self.max_capacity, after))
+
+        if not frame_ts:
+            now_utc = datetime.now(timezone.utc)
+            frame_ts.append((
+                now_utc,
+                now_utc.isoformat(),
+                now_utc.astimezone(_TZ_NY).strftime("%Y-%m-%d %I:%M:%S %p %Z"),
+            ))
+        ts_utc, ts_utc_iso, ts_local = frame_ts[0]
+
+        event = {
+            "ts_utc": ts_utc_iso,
+            "ts_local": ts_local,
+            "delta": int(delta),
+            "track_id": int(tid),
+            "cls": int(cid),
+            "speed_px_s": round(abs(vy), 1),
+            "y_ref": round(float(yR), 1),
+            "occupancy_before": before,
+            "occupancy_after": after,
+        }
+
+        self.occupancy = after
+        self.events_recent.append(event)
+
+        hook = getattr(self, "on_occupancy_update", None)
+        if hook is not None:
+            try:
+                hook(
+                    ts_utc=ts_utc,
+                    occupancy_after=after,
+                    max_capacity=self.max_capacity,
+                )
+            except Exception as e:
+                self._log_q.put_nowait({
+                    "ts": ts_utc_iso,
+                    "hook_error": str(e),
+                })
+
+        self._log_q.put_nowait({"event": event, "occupancy": after})
+
     # ------------------------------------------------------------------
     # Core per-frame processing
     # ------------------------------------------------------------------
     def process(self, frame, detections, t_now):
         """
         frame: numpy array (BGR)
-        detections: list of dicts:
+        detections: either SoA arrays from the Hailo path:
+            (ids int32 (N,), xyxy float32 (N,4), confs float32 (N,))
+        or the legacy list of dicts from the CPU path:
             {"id": track_id, "cls": cid, "conf": conf, "xyxy": (x1,y1,x2,y2)}
         """
-        args = self.args
-
-        # --- config knobs ----
-        yref_mode = getattr(args, "yref", "topq")
-        min_speed = float(getattr(args, "min_speed", 0.1))
-        max_speed_px_s = float(getattr(args, "max_speed_px_s", 0.0))
-        cooldown_s = float(getattr(args, "cooldown_s", 0.0))
-        hyst_px = int(getattr(args, "hyst_px", 2))
-        # min_track_age & implied_seq are ignored in this simplified logic
-        invert_dir = bool(getattr(args, "invert_dir", False))
-        min_box_w = int(getattr(args, "min_box_w", 3))
-        min_box_h = int(getattr(args, "min_box_h", 3))
-        max_ar = float(getattr(args, "max_ar", 5.0))
-        max_capacity = int(getattr(args, "max_capacity", 73))
-        show_labels = bool(getattr(args, "show_labels", True))
-        debug_hits = bool(getattr(args, "debug_hits", False))
-        display = bool(getattr(args, "display", True))
-
-        # mask opacity; >0 means we draw the semi-transparent gate bands
-        mask_alpha = float(getattr(args, "mask_alpha", 0.25))
+        # config knobs as locals (resolved once in __init__)
+        yref_mode = self.yref_mode
+        min_speed = self.min_speed
+        max_speed_px_s = self.max_speed_px_s
+        cooldown_s = self.cooldown_s
+        hyst_px = self.hyst_px
+        invert_dir = self.invert_dir
+        min_box_w = self.min_box_w
+        min_box_h = self.min_box_h
+        max_ar = self.max_ar
+        max_capacity = self.max_capacity
+        show_labels = self.show_labels
+        debug_hits = self.debug_hits
+        display = self.display
+        mask_alpha = self.mask_alpha
 
         # -----------------------------------
         # initial occupancy push (bootstrap / seed)
@@ -167,10 +336,10 @@ class MarginCounter:
                             max_capacity=max_capacity,
                         )
                     except Exception as e:
-                        print(json.dumps({
+                        self._log_q.put_nowait({
                             "ts": ts_utc.isoformat(),
                             "hook_error": str(e),
-                        }))
+                        })
                 self._initial_pushed = True
                 self.bootstrap_done = True
 
@@ -187,112 +356,99 @@ class MarginCounter:
                             max_capacity=max_capacity,
                         )
                     except Exception as e:
-                        print(json.dumps({
+                        self._log_q.put_nowait({
                             "ts": ts_utc.isoformat(),
                             "hook_error": str(e),
-                        }))
+                        })
                 self._initial_pushed = True
 
-        # -----------------------------------
-        # helpers
-        # -----------------------------------
-        def ref_y(y1, y2):
-            if yref_mode == "center":
-                return (y1 + y2) * 0.5
-            if yref_mode == "top":
-                return y1
-            if yref_mode == "bottom":
-                return y2
-            # default "topq" (top quarter)
-            return y1 + 0.25 * (y2 - y1)
-
-        def box_ok(x1, y1b, x2, y2b):
-            bw = max(0.0, x2 - x1)
-            bh = max(0.0, y2b - y1b)
-            if bw < min_box_w or bh < min_box_h:
-                return False
-            if bh > 0 and bw > 0:
-                ar = max(bw / bh, bh / bw)
-                if ar > max_ar:
-                    return False
-            return True
-
-        def emit_event(tid, cid, vy, yR, delta, box=None):
-            """Update occupancy and record an event."""
-            before = self.occupancy
-            after = before + (1 if delta > 0 else -1)
-            after = max(0, min(max_capacity, after))
-
-            ts_utc = datetime.now(timezone.utc)
-            ts_est = ts_utc.astimezone(ZoneInfo("America/New_York"))
-
-            event = {
-                "ts_utc": ts_utc.isoformat(),
-                "ts_local": ts_est.strftime("%Y-%m-%d %I:%M:%S %p %Z"),
-                "delta": int(delta),
-                "track_id": int(tid),
-                "cls": int(cid),
-                "speed_px_s": round(abs(vy), 1),
-                "y_ref": round(float(yR), 1),
-                "occupancy_before": before,
-                "occupancy_after": after,
-            }
-
-            self.occupancy = after
-            self.events_recent.append(event)
-
-            hook = getattr(self, "on_occupancy_update", None)
-            if hook is not None:
-                try:
-                    hook(ts_utc=ts_utc, occupancy_after=after, max_capacity=max_capacity)
-                except Exception as e:
-                    print(json.dumps({
-                        "ts": ts_utc.isoformat(),
-                        "hook_error": str(e),
-                    }))
-
-            print(json.dumps({"event": event, "occupancy": self.occupancy}))
+        # Event timestamps are computed lazily, once per frame: every event a
+        # frame emits shares one datetime + isoformat + strftime instead of
+        # re-running them (and the tz conversion) per event.
+        frame_ts = []
+        emit_event = self._emit_event
 
         # -----------------------------------
         # main logic
         # -----------------------------------
-        for det in detections:
-            tid = det.get("id", -1)
-            cid = det.get("cls", -1)
-            if tid is None or tid < 0:
-                continue
+        # Normalize the two input contracts into parallel arrays. The array
+        # form is already filtered to tracked detections, all vehicles
+        # mapped to class 2 ("car").
+        if isinstance(detections, tuple):
+            ids_arr, xyxy_arr, _confs = detections
+            cls_arr = np.full(ids_arr.size, 2, dtype=np.int32)
+        else:
+            n = len(detections)
+            ids_arr = np.fromiter(
+                ((-1 if d.get("id") is None else d["id"]) for d in detections),
+                dtype=np.int32,
+                count=n,
+            )
+            cls_arr = np.fromiter(
+                (d.get("cls", -1) for d in detections), dtype=np.int32, count=n
+            )
+            xyxy_arr = np.asarray(
+                [d["xyxy"] for d in detections], dtype=np.float32
+            ).reshape(-1, 4)
+
+        # Batched box filter + reference geometry: same tests the old
+        # per-detection box_ok() ran, in a few vectorized passes instead of
+        # N Python calls.
+        x1s = xyxy_arr[:, 0]
+        y1s = xyxy_arr[:, 1]
+        x2s = xyxy_arr[:, 2]
+        y2s = xyxy_arr[:, 3]
+        bw = np.maximum(0.0, x2s - x1s)
+        bh = np.maximum(0.0, y2s - y1s)
+        ok = (ids_arr >= 0) & (bw >= min_box_w) & (bh >= min_box_h)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ar_bad = (bw > 0) & (bh > 0) & (np.maximum(bw / bh, bh / bw) > max_ar)
+        keep = np.where(ok & ~ar_bad)[0]
+
+        cxs = (x1s + x2s) * 0.5
+        cys = (y1s + y2s) * 0.5
+        if yref_mode == "center":
+            yRs = cys
+        elif yref_mode == "top":
+            yRs = y1s
+        elif yref_mode == "bottom":
+            yRs = y2s
+        else:
+            # default "topq" (top quarter)
+            yRs = y1s + 0.25 * (y2s - y1s)
 
-            x1, y1b, x2, y2b = det["xyxy"]
-            if not box_ok(x1, y1b, x2, y2b):
-                continue
+        for i in keep:
+            tid = int(ids_arr[i])
+            cid = int(cls_arr[i])
 
-            cx = float((x1 + x2) * 0.5)
-            cy = float((y1b + y2b) * 0.5)
-            yR = float(ref_y(y1b, y2b))
+            cx = float(cxs[i])
+            cy = float(cys[i])
+            yR = float(yRs[i])
 
             for gate in self.gates:
-                st = gate.state[tid]
-                top = gate.top()
-                bot = gate.bot()
+                s = gate.slot_for(tid)
+                top = gate._top
+                bot = gate._bot
 
                 # -------- init per-track state for this gate --------
-                if st["y_prev"] is None:
-                    st["y_prev"] = yR
-                    st["t_prev"] = t_now
+                y_prev = gate.y_prev[s]
+                if y_prev != y_prev:  # NaN: first time we see this track
+                    gate.y_prev[s] = yR
+                    gate.t_prev[s] = t_now
                     # set initial region
                     if yR < top - hyst_px:
-                        st["region"] = "above"
+                        gate.region[s] = _ABOVE
                     elif yR > bot + hyst_px:
-                        st["region"] = "below"
+                        gate.region[s] = _BELOW
                     else:
-                        st["region"] = "inside"
-                    st["in_band"] = (st["region"] == "inside")
-                    st["origin_side"] = None
+                        gate.region[s] = _INSIDE
+                    gate.in_band[s] = (gate.region[s] == _INSIDE)
+                    gate.origin_side[s] = _INSIDE
                     continue
 
                 # -------- compute vy --------
-                dt = max(1e-3, t_now - st["t_prev"])
-                vy = (yR - st["y_prev"]) / dt  # +down, -up
+                dt = max(1e-3, t_now - gate.t_prev[s])
+                vy = (yR - y_prev) / dt  # +down, -up
 
                 if max_speed_px_s > 0:
                     if vy > max_speed_px_s:
@@ -302,17 +458,17 @@ class MarginCounter:
 
                 # -------- current region relative to band --------
                 if yR < top - hyst_px:
-                    region = "above"
+                    region = _ABOVE
                 elif yR > bot + hyst_px:
-                    region = "below"
+                    region = _BELOW
                 else:
-                    region = "inside"
+                    region = _INSIDE
 
-                prev_region = st.get("region", "inside")
+                prev_region = gate.region[s]
 
                 # -------- gating conditions --------
                 in_x = (gate.xmin <= cx <= gate.xmax)
-                since = t_now - gate.last_event_at[tid]
+                since = t_now - gate.last_event_at[s]
                 speed_ok = abs(vy) >= min_speed
                 cd_ok = since >= max(0.0, cooldown_s)
 
@@ -323,93 +479,61 @@ class MarginCounter:
                 # If we never had a clear origin_side (track spawned inside band),
                 # fall back to the original vy-based logic so we still count.
 
-                if region == "inside":
+                if region == _INSIDE:
                     # Just entered the band?
-                    if prev_region != "inside":
-                        if prev_region in ("above", "below"):
-                            st["origin_side"] = prev_region
-                        else:
-                            st["origin_side"] = None
-                    st["in_band"] = True
+                    if prev_region != _INSIDE:
+                        # prev_region is _ABOVE/_BELOW here, which is exactly
+                        # the origin_side code we want to remember
+                        gate.origin_side[s] = prev_region
+                    gate.in_band[s] = True
 
                 else:
                     # We are outside the band (above or below)
-                    if prev_region == "inside" and st.get("in_band", False):
-                        origin = st.get("origin_side")
+                    if prev_region == _INSIDE and gate.in_band[s]:
+                        origin = gate.origin_side[s]
 
                         if in_x and speed_ok and cd_ok:
-                            if (
-                                origin in ("above", "below")
-                                and region in ("above", "below")
-                                and region != origin
-                            ):
+                            if origin != _INSIDE and region != origin:
                                 # Preferred: full crossing based on origin vs exit side
-                                if origin == "above" and region == "below":
+                                if origin == _ABOVE and region == _BELOW:
                                     raw_delta = +1   # A->B (enter lot)
-                                elif origin == "below" and region == "above":
+                                elif origin == _BELOW and region == _ABOVE:
                                     raw_delta = -1   # B->A (leave lot)
                                 else:
                                     raw_delta = 0
 
                                 if raw_delta != 0:
                                     delta = -raw_delta if invert_dir else raw_delta
-                                    emit_event(
-                                        tid, cid, vy, yR, delta, box=(x1, y1b, x2, y2b)
-                                    )
-                                    gate.last_event_at[tid] = t_now
+                                    emit_event(frame_ts, tid, cid, vy, yR, delta)
+                                    gate.last_event_at[s] = t_now
 
-                            elif origin is None:
+                            elif origin == _INSIDE:
                                 # Fallback: behave like your original logic
                                 # y grows downward. vy > 0 => moving down, vy < 0 => moving up.
-                                if region == "below" and vy > 0:
+                                if region == _BELOW and vy > 0:
                                     delta = +1 if not invert_dir else -1
-                                    emit_event(
-                                        tid, cid, vy, yR, delta, box=(x1, y1b, x2, y2b)
-                                    )
-                                    gate.last_event_at[tid] = t_now
+                                    emit_event(frame_ts, tid, cid, vy, yR, delta)
+                                    gate.last_event_at[s] = t_now
 
-                                elif region == "above" and vy < 0:
+                                elif region == _ABOVE and vy < 0:
                                     delta = -1 if not invert_dir else +1
-                                    emit_event(
-                                        tid, cid, vy, yR, delta, box=(x1, y1b, x2, y2b)
-                                    )
-                                    gate.last_event_at[tid] = t_now
+                                    emit_event(frame_ts, tid, cid, vy, yR, delta)
+                                    gate.last_event_at[s] = t_now
 
                     # Reset band state whenever we are outside
-                    st["in_band"] = False
-                    st["origin_side"] = None
+                    gate.in_band[s] = False
+                    gate.origin_side[s] = _INSIDE
 
                 # -------- update state for next frame --------
-                st["y_prev"] = yR
-                st["t_prev"] = t_now
-                st["region"] = region
-
-                # -------- draw per-box --------
-                if display:
-                    in_any = False
-                    for g in self.gates:
-                        if g.xmin <= cx <= g.xmax and g.top() <= cy <= g.bot():
-                            in_any = True
-                            break
-                    color = (0, 255, 0) if in_any else (200, 200, 200)
-                    cv2.rectangle(
-                        frame, (int(x1), int(y1b)), (int(x2), int(y2b)), color, 2
-                    )
-                    if show_labels:
-                        put(
-                            frame,
-                            f"id:{int(tid)} c:{int(cid)}",
-                            (int(x1), max(12, int(y1b) - 4)),
-                            0.48,
-                            color,
-                            1,
-                        )
+                gate.y_prev[s] = yR
+                gate.t_prev[s] = t_now
+                gate.region[s] = region
 
                 # if debug_hits:
                 #     info = (
-                #         f"{gate.name}: reg={st.get('region')} "
-                #         f"in={st.get('in_band')} "
-                #         f"orig={st.get('origin_side')} "
+                #         f"{gate.name}: reg={region} "
+                #         f"in={gate.in_band[s]} "
+                #         f"orig={gate.origin_side[s]} "
                 #         f"vy={vy:+.1f}"
                 #     )
                 #     put(
@@ -425,56 +549,97 @@ class MarginCounter:
         # draw gate MASKS + gate outlines + HUD
         # ------------------------------------------------------------------
         if display:
-            # 1) semi-transparent gate masks
-            if mask_alpha > 0:
-                overlay = frame.copy()
-                for gi, gate in enumerate(self.gates):
-                    top, bot = gate.top(), gate.bot()
-                    cv2.rectangle(
-                        overlay,
-                        (int(gate.xmin), int(top)),
-                        (int(gate.xmax), int(bot)),
-                        (0, 255, 255),
-                        -1,
+            # 0) detection boxes, one polylines call per color instead of a
+            #    cv2.rectangle crossing per detection (and no longer repeated
+            #    per gate like the old in-loop draw)
+            if keep.size:
+                dx1 = x1s[keep].astype(np.int32)
+                dy1 = y1s[keep].astype(np.int32)
+                dx2 = x2s[keep].astype(np.int32)
+                dy2 = y2s[keep].astype(np.int32)
+                dcx = cxs[keep]
+                dcy = cys[keep]
+
+                in_any = np.zeros(keep.size, dtype=bool)
+                for g in self.gates:
+                    in_any |= (
+                        (dcx >= g.xmin) & (dcx <= g.xmax)
+                        & (dcy >= g._top) & (dcy <= g._bot)
                     )
-                cv2.addWeighted(overlay, mask_alpha, frame, 1.0 - mask_alpha, 0, frame)
 
-            # 2) gate outlines + labels
+                pts = np.stack(
+                    [
+                        np.stack([dx1, dy1], axis=1),
+                        np.stack([dx2, dy1], axis=1),
+                        np.stack([dx2, dy2], axis=1),
+                        np.stack([dx1, dy2], axis=1),
+                    ],
+                    axis=1,
+                )  # (N, 4, 2)
+                for color, sel in (((0, 255, 0), in_any), ((200, 200, 200), ~in_any)):
+                    if sel.any():
+                        cv2.polylines(frame, pts[sel], True, color, 2)
+
+                if show_labels:
+                    y_text = np.maximum(12, dy1 - 4)
+                    d_ids = ids_arr[keep]
+                    d_cls = cls_arr[keep]
+                    for i in range(keep.size):
+                        color = (0, 255, 0) if in_any[i] else (200, 200, 200)
+                        put(
+                            frame,
+                            "id:%d c:%d" % (d_ids[i], d_cls[i]),
+                            (int(dx1[i]), int(y_text[i])),
+                            0.48,
+                            color,
+                            1,
+                        )
+
+            # 1) gate band + outline + label, one pass per gate — the band
+            #    ROI just blended is still cache-hot when the outline and
+            #    label land on it
+            beta = 1.0 - mask_alpha
             for gi, gate in enumerate(self.gates):
-                top, bot = gate.top(), gate.bot()
+                top, bot = gate._top, gate._bot
+                if mask_alpha > 0:
+                    roi = frame[
+                        max(0, int(top)): int(bot) + 1,
+                        int(gate.xmin): int(gate.xmax) + 1,
+                    ]
+                    band = self._band_tiles[gi][: roi.shape[0], : roi.shape[1]]
+                    cv2.addWeighted(band, mask_alpha, roi, beta, 0, roi)
+                color = (
+                    (0, 255, 255)
+                    if gi != self.active_gate_idx
+                    else (0, 200, 255)
+                )
                 cv2.rectangle(
                     frame,
                     (int(gate.xmin), int(top)),
                     (int(gate.xmax), int(bot)),
-                    (0, 255, 255)
-                    if gi != self.active_gate_idx
-                    else (0, 200, 255),
+                    color,
                     2,
                 )
-                put(
-                    frame,
-                    f"{gate.name} A={top}px B={bot}px X=[{gate.xmin},{gate.xmax}]",
-                    (10, 26 + gi * 18),
-                    0.5,
-                    (0, 255, 255)
-                    if gi != self.active_gate_idx
-                    else (0, 200, 255),
-                    1,
-                )
+                put(frame, self._gate_labels[gi], (10, 26 + gi * 18), 0.5, color, 1)
 
-            # 3) Occupancy HUD
+            # 2) Occupancy HUD
+            occ_val, occ_str = self._occ_label
+            if occ_val != self.occupancy:
+                occ_str = f"Occupancy: {self.occupancy}"
+                self._occ_label = (self.occupancy, occ_str)
             put(
                 frame,
-                f"Occupancy: {self.occupancy}",
+                occ_str,
                 (10, frame.shape[0] - 10),
                 0.9,
                 (200, 255, 200),
                 2,
             )
 
-            # 4) ticker (last few events)
+            # 3) ticker (last few events)
             y0 = 60
-            for i, e in enumerate(list(self.events_recent)[-5:]):
+            n_ev = len(self.events_recent)
+            for i, e in enumerate(islice(self.events_recent, max(0, n_ev - 5), n_ev)):
                 ts_display = e.get("ts_local") or e.get("ts_utc", "")
                 msg = (
                     f"{ts_display} "
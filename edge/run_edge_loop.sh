@@ -158,6 +158,9 @@ while true; do
   compute_seed_and_bootstrap
 
   echo "=== Starting Hailo margin counter at $(date) ==="
+  # `|| status=$?` keeps set -e from killing the loop on a nonzero exit:
+  # the watchdog deliberately exits 201 (restart script) / 200 (reboot).
+  status=0
   python3 hailo_margin_counter.py \
     --input rpi \
     --use-frame \
@@ -173,9 +176,8 @@ while true; do
     --min_box_h 4 \
     --max_capacity 73 \
     --seed_occupancy "${SEED_OCC}" \
-    --debug_hits
+    --debug_hits || status=$?
 
-  status=$?
   echo "=== margin_counter exited with code $status at $(date) ==="
 
   # Ctrl+C: let you stop everything (you can still use your 2x Ctrl+C habit)
@@ -190,6 +192,11 @@ while true; do
     exit 0
   fi
 
+  # Watchdog freeze (1st/2nd) – fall through to the normal restart below
+  if [[ $status -eq 201 ]]; then
+    echo "Watchdog reported a frozen pipeline – restarting the counter."
+  fi
+
   # Segfaults (139) – likely Hailo/camera wedge
   if [[ $status -eq 139 ]]; then
     segfaults=$((segfaults + 1))